@@ -0,0 +1,322 @@
+# This script measures how the scripts scale with the size of the cohort.
+# It creates a local cohort with svnadmin (one repository per student,
+# file:// URLs), simulates submissions and feedback and times:
+# - svn_update.py (full and --changed_only)
+# - final_check.py (full and incremental)
+# - the non-interactive checks of correction_script.py
+# - svn_commit.py --batch
+# The results are written as JSON together with the configuration and the
+# git commit, so runs can be compared between commits.
+
+from subprocess import call, Popen, PIPE
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import getopt
+import tempfile
+import platform
+
+
+# Color schemes
+HEADER = '\033[95m'
+OKBLUE = '\033[94m'
+OKGREEN = '\033[92m'
+WARNING = '\033[93m'
+FAIL = '\033[91m'
+ENDC = '\033[0m'
+BOLD = '\033[1m'
+UNDERLINE = '\033[4m'
+
+MAKEFILE = """test:
+\t@echo "Running tests"
+checkstyle:
+\t@echo "Running checkstyle"
+compile:
+\t@echo "Compiling"
+clean:
+\t@echo "Cleaning"
+"""
+
+FEEDBACK = """Aufgabe 1
+%d/5
+
+Aufgabe 2
+%d/5
+
+Aufgabe 3
+%d/10
+
+%d/20
+"""
+
+
+def run_quietly(command, cwd=None):
+    with open(os.devnull, "w") as devnull:
+        if call(command, cwd=cwd, stdout=devnull, stderr=devnull) != 0:
+            raise RuntimeError("Command failed: %s" % " ".join(command))
+
+
+def write_file(path, content):
+    with open(path, "w") as file:
+        file.write(content)
+
+
+def write_submission(rng, path_to_sheet, num_files):
+    if not os.path.isdir(path_to_sheet):
+        os.makedirs(path_to_sheet)
+    write_file(path_to_sheet + "Makefile", MAKEFILE)
+    write_file(path_to_sheet + "erfahrungen.txt", "Zeit: %dh\n" % rng.randint(1, 20))
+    for i in range(num_files):
+        lines = ["int f%d_%d(int x) {" % (i, j) + " return x * %d; }" % rng.randint(0, 1000)
+                 for j in range(rng.randint(10, 200))]
+        write_file(path_to_sheet + "file%d.c" % i, "\n".join(lines) + "\n")
+
+
+def create_cohort(work_dir, num_students, num_sheets, num_changes, seed):
+    """Creates one repository per student, checks them out into
+    <work_dir>/abgaben and prepares pending submissions and feedback.
+    Returns the path to the abgaben directory.
+
+    Arguments:
+    work_dir - A string. Empty directory for all files of the benchmark.
+    num_students - An integer. Number of students.
+    num_sheets - An integer. Number of sheets, the last one is corrected.
+    num_changes - An integer. Number of files changed per new submission.
+    seed - An integer. Seed for the generated content.
+    """
+    rng = random.Random(seed)
+    repos = work_dir + "repos/"
+    abgaben = work_dir + "abgaben/"
+    students_side = work_dir + "students/"
+    for path in [repos, abgaben, students_side]:
+        os.makedirs(path)
+    sheet_num = "%02d" % num_sheets
+
+    for s in range(num_students):
+        student = "student%03d" % s
+        url = "file://" + repos + student
+        run_quietly(["svnadmin", "create", repos + student])
+
+        # Old sheets were submitted and corrected before
+        tree = work_dir + "import/" + student + "/"
+        for sheet in range(1, num_sheets):
+            path_to_sheet = tree + "blatt-%02d/" % sheet
+            write_submission(rng, path_to_sheet, 3)
+            write_file(path_to_sheet + "feedback-tutor.txt", FEEDBACK % (5, 4, 8, 17))
+        write_file(tree + "README", "Repository of %s\n" % student)
+        run_quietly(["svn", "import", "-q", "-m", "Initial import", tree, url])
+        run_quietly(["svn", "checkout", "-q", url, abgaben + student])
+
+        # Most students submit the current sheet after the last update
+        if rng.random() < 0.9:
+            run_quietly(["svn", "checkout", "-q", url, students_side + student])
+            path_to_sheet = students_side + student + "/blatt-" + sheet_num + "/"
+            write_submission(rng, path_to_sheet, max(num_changes, 1))
+            run_quietly(["svn", "add", "-q", path_to_sheet])
+            run_quietly(["svn", "commit", "-q", "-m", "Submission", students_side + student])
+    shutil.rmtree(work_dir + "import/")
+    return abgaben
+
+
+def write_feedback(abgaben, num_sheets, seed):
+    """Writes a feedback file for every submission of the current sheet."""
+    rng = random.Random(seed)
+    sheet_num = "%02d" % num_sheets
+    for student in sorted(os.listdir(abgaben)):
+        path_to_sheet = abgaben + student + "/blatt-" + sheet_num + "/"
+        if os.path.isdir(path_to_sheet):
+            points = [rng.randint(0, 5), rng.randint(0, 5), rng.randint(0, 10)]
+            write_file(path_to_sheet + "feedback-tutor.txt", FEEDBACK % tuple(points + [sum(points)]))
+
+
+class Timer:
+    """Runs a phase with all output sent to /dev/null and measures it. A
+    phase that exits with a non-zero status is recorded as failed.
+    """
+
+    def __init__(self):
+        self.results = {}
+        # Name of each failed phase -> exit status of its last failure
+        self.failures = {}
+
+
+    def run(self, name, function, *args):
+        sys.stdout.flush()
+        saved_stdout = os.dup(1)
+        saved_python_stdout = sys.stdout
+        devnull = open(os.devnull, "w")
+        os.dup2(devnull.fileno(), 1)
+        sys.stdout = devnull
+        start = time.time()
+        status = 0
+        try:
+            function(*args)
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else 0
+        finally:
+            duration = time.time() - start
+            sys.stdout = saved_python_stdout
+            os.dup2(saved_stdout, 1)
+            os.close(saved_stdout)
+            devnull.close()
+        self.results.setdefault(name, []).append(duration)
+        if status:
+            self.failures[name] = status
+            print(FAIL + "    %-28s %8.3fs  failed with exit status %d" % (name, duration, status) + ENDC)
+        else:
+            print(OKBLUE + "    %-28s %8.3fs" % (name, duration) + ENDC)
+
+
+def run_benchmark(work_dir, num_students, num_sheets, num_changes, seed, jobs, timer):
+    import svn_update
+    import final_check
+    import correction_script
+    import svn_commit
+    import svn_tools
+    import make_runner
+
+    abgaben = create_cohort(work_dir, num_students, num_sheets, num_changes, seed)
+    sheet_num = "%02d" % num_sheets
+    directories = sorted(os.listdir(abgaben))
+
+    # Point all scripts to the generated cohort
+    svn_update.PATH = abgaben
+    svn_update.STATE_PATH = work_dir + "svn_update_state.json"
+    final_check.PATH = abgaben
+    final_check.STATE_PATH = work_dir + "final_check_state.json"
+    final_check.c = correction_script.Correction()
+    final_check.c.directory_path = abgaben
+    svn_commit.PATH = abgaben
+    svn_commit.svn_snapshot = svn_tools.SvnSnapshot(abgaben)
+    svn_commit.raw_input = lambda prompt: ""
+
+    if jobs > 1:
+        timer.run("svn_update -j %d" % jobs, svn_update.update_all_students_concurrently, directories, jobs)
+    else:
+        timer.run("svn_update", svn_update.update_all_students, directories)
+    timer.run("svn_update --changed_only", svn_update.update_changed_students, directories, max(jobs, 1))
+
+    write_feedback(abgaben, num_sheets, seed)
+    if jobs > 1:
+        timer.run("final_check -j %d --full" % jobs, final_check.final_check_all_students_concurrently,
+                  directories, sheet_num, jobs, False, True)
+    else:
+        timer.run("final_check --full", final_check.final_check_all_students, directories, sheet_num, False, True)
+    timer.run("final_check incremental", final_check.final_check_all_students, directories, sheet_num)
+
+    correction = correction_script.Correction()
+    correction.directory_path = abgaben
+    correction.make_cache = make_runner.MakeCache(work_dir + "make_cache/")
+    def correction_checks():
+        for student in directories:
+            path_to_sheet = abgaben + student + "/blatt-" + sheet_num + "/"
+            correction.get_student_preferences(student)
+            if not os.path.isdir(path_to_sheet):
+                continue
+            correction.is_dir_clean(path_to_sheet)
+            correction.is_file_in_dir(path_to_sheet, ["erfahrungen.txt", "Makefile"])
+            correction.check_assigned_points(path_to_sheet)
+            correction.run_svn_diff(path_to_sheet)
+            correction.run_make(path_to_sheet)
+    timer.run("correction checks", correction_checks)
+    timer.run("correction checks (cached)", correction_checks)
+
+    timer.run("svn_commit --batch", svn_commit.commit_all_students_batch, directories, sheet_num, max(jobs, 1))
+
+
+def get_version(command):
+    try:
+        p = Popen(command, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+        output, err = p.communicate()
+        return output.strip().split("\n")[0]
+    except OSError:
+        return None
+
+
+def print_usage_and_exit():
+    print(WARNING + "Usage: python ./benchmark.py [-n <students>] [-s <sheets>] [-c <changes>] "
+          "[-r <repetitions>] [-j <workers>] [--seed <n>] [-o <file>]" + ENDC)
+    sys.exit(2)
+
+
+def main():
+    options = "n:s:c:r:j:o:h"
+    long_options = ["students=", "sheets=", "changes=", "repetitions=", "jobs=", "seed=", "output=", "help"]
+    try:
+        opts, args = getopt.gnu_getopt(sys.argv, options, long_options)
+    except getopt.GetoptError:
+        print("There has been an error while parsing the command line arguments.")
+        print_usage_and_exit()
+
+    config = {"students": 25, "sheets": 3, "changes": 2, "repetitions": 3, "jobs": 1, "seed": 0}
+    output_path = None
+    try:
+        for opt, opt_args in opts:
+            if opt == '-n' or opt == '--students': config["students"] = int(opt_args)
+            elif opt == '-s' or opt == '--sheets': config["sheets"] = int(opt_args)
+            elif opt == '-c' or opt == '--changes': config["changes"] = int(opt_args)
+            elif opt == '-r' or opt == '--repetitions': config["repetitions"] = int(opt_args)
+            elif opt == '-j' or opt == '--jobs': config["jobs"] = int(opt_args)
+            elif opt == '--seed': config["seed"] = int(opt_args)
+            elif opt == '-o' or opt == '--output': output_path = opt_args
+            elif opt == '-h' or opt == '--help':
+                string = ("Usage: python ./benchmark.py [arguments]\n\n"
+                          "Arguments:\n"
+                          "-n, --students <n>\t" + "Number of students (default 25).\n"
+                          "-s, --sheets <n>\t" + "Number of sheets, the last one is corrected (default 3).\n"
+                          "-c, --changes <n>\t" + "Number of files per new submission (default 2).\n"
+                          "-r, --repetitions <n>\t" + "Number of runs, the median is reported (default 3).\n"
+                          "-j, --jobs <n>\t\t" + "Number of workers for the parallel modes (default 1).\n"
+                          "--seed <n>\t\t" + "Seed for the generated cohort (default 0).\n"
+                          "-o, --output <file>\t" + "Write the results as JSON to <file>.\n"
+                          "-h, --help\t\t" + "Show help options.\n")
+                print(BOLD + string + ENDC)
+                sys.exit(2)
+    except ValueError:
+        print_usage_and_exit()
+    if len(args) != 1 or config["students"] < 1 or config["sheets"] < 1 or config["repetitions"] < 1:
+        print_usage_and_exit()
+
+    if get_version(["svnadmin", "--version", "--quiet"]) is None:
+        print(FAIL + "The benchmark needs svn and svnadmin." + ENDC)
+        sys.exit(1)
+
+    timer = Timer()
+    for repetition in range(config["repetitions"]):
+        print(OKBLUE + BOLD + "Run %d of %d" % (repetition + 1, config["repetitions"]) + ENDC)
+        work_dir = tempfile.mkdtemp(prefix="tutorage-benchmark-") + "/"
+        try:
+            run_benchmark(work_dir, config["students"], config["sheets"], config["changes"],
+                          config["seed"], config["jobs"], timer)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {}
+    print(HEADER + "\n" + "*"*80 + ENDC)
+    print(OKBLUE + BOLD + "Median of %d runs" % config["repetitions"] + ENDC)
+    for name in sorted(timer.results):
+        durations = sorted(timer.results[name])
+        median = durations[len(durations) // 2]
+        results[name] = {"runs": timer.results[name], "median": median}
+        if name in timer.failures:
+            results[name]["failed"] = True
+            print(FAIL + "    %-28s %8.3fs  failed" % (name, median) + ENDC)
+        else:
+            print(OKGREEN + "    %-28s %8.3fs" % (name, median) + ENDC)
+
+    if output_path:
+        report = {"config": config,
+                  "git_commit": get_version(["git", "rev-parse", "HEAD"]),
+                  "python": platform.python_version(),
+                  "svn": get_version(["svn", "--version", "--quiet"]),
+                  "results": results}
+        with open(output_path, "w") as file:
+            json.dump(report, file, indent=1, sort_keys=True)
+        print(OKGREEN + "Wrote the results to %s" % output_path + ENDC)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
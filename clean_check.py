@@ -0,0 +1,127 @@
+import os
+import re
+from dir_snapshot import scan
+
+
+# Files above this size are reported, whatever they contain
+MAX_FILE_SIZE = 1024 * 1024
+# Maximum total size of a blatt-xx directory. Sheets with larger data files
+# get their own budget.
+DEFAULT_SHEET_BUDGET = 5 * 1024 * 1024
+SHEET_BUDGETS = {}
+
+# Magic bytes at the start of files that don't belong into a repository
+MAGIC_NUMBERS = [(b"\x7fELF", "ELF binary"),
+                 (b"!<arch>\n", "static library"),
+                 (b"\xca\xfe\xba\xbe", "Java class file"),
+                 (b"\xcf\xfa\xed\xfe", "Mach-O binary"),
+                 (b"\xce\xfa\xed\xfe", "Mach-O binary"),
+                 (b"MZ", "Windows executable"),
+                 (b"PK\x03\x04", "zip archive"),
+                 (b"\x1f\x8b", "gzip archive")]
+# Type of an ELF file from the e_type field at offset 16 (little endian)
+ELF_TYPES = {1: "object file", 2: "executable", 3: "executable or shared library", 4: "core dump"}
+CORE_PATTERN = re.compile(r"^core(\.\d+)?$")
+
+
+def get_sheet_budget(sheet_num):
+    return SHEET_BUDGETS.get(sheet_num, DEFAULT_SHEET_BUDGET)
+
+
+def format_size(size):
+    for unit in ["B", "KB", "MB"]:
+        if size < 1024:
+            return "%d %s" % (size, unit) if unit == "B" else "%.1f %s" % (size, unit)
+        size /= 1024.0
+    return "%.1f GB" % size
+
+
+def get_file_type(path):
+    """Returns a description of the file if it is a binary, archive or core
+    dump according to its magic bytes or name, None otherwise.
+
+    Arguments:
+    path - A string. Path to the file.
+    """
+    try:
+        with open(path, "rb") as file:
+            header = file.read(18)
+    except (IOError, OSError):
+        return None
+    for magic, description in MAGIC_NUMBERS:
+        if header.startswith(magic):
+            if magic == b"\x7fELF" and len(header) == 18:
+                return "ELF " + ELF_TYPES.get(bytearray(header)[16], "binary")
+            return description
+    if CORE_PATTERN.match(os.path.basename(path)):
+        return "core dump"
+    return None
+
+
+def check_file(path, size):
+    """Returns why the file doesn't belong into a repository or None.
+
+    Arguments:
+    path - A string. Path to the file.
+    size - An integer. Size of the file in bytes.
+    """
+    file_type = get_file_type(path)
+    if file_type:
+        return file_type
+    if size > MAX_FILE_SIZE:
+        return "larger than %s" % format_size(MAX_FILE_SIZE)
+    return None
+
+
+def walk_files(path, prefix=""):
+    """Returns a list of (relative path, size, is link) of all files below
+    <path> without the .svn directories. Symbolic links are listed, not
+    followed, so a link to a parent directory doesn't count its files again.
+    """
+    files = []
+    for entry in scan(path, follow_symlinks=False):
+        if entry.is_dir:
+            if entry.name != ".svn":
+                files += walk_files(os.path.join(path, entry.name), prefix + entry.name + "/")
+        else:
+            files.append((prefix + entry.name, entry.size, entry.is_link))
+    return files
+
+
+def scan_sheet(path):
+    """Checks the sizes and magic bytes of all files of a sheet.
+    Returns a list of (relative path, size, reason) of all suspicious files,
+    sorted by path, and the total size of the sheet.
+
+    Arguments:
+    path - A string. Path to the blatt-xx directory of the student.
+    """
+    if not os.path.isdir(path):
+        return [], 0
+    problems = []
+    total_size = 0
+    for name, size, is_link in sorted(walk_files(path)):
+        total_size += size
+        if is_link:
+            problems.append((name, size, "symbolic link to %s" % os.readlink(os.path.join(path, name))))
+            continue
+        reason = check_file(os.path.join(path, name), size)
+        if reason:
+            problems.append((name, size, reason))
+    return problems, total_size
+
+
+def format_problems(problems, total_size, sheet_num):
+    """Returns one line per suspicious file and one if <total_size> is
+    larger than the budget of the sheet.
+
+    Arguments:
+    problems - A list of (relative path, size, reason) from scan_sheet.
+    total_size - An integer. Size of the checked files in bytes.
+    sheet_num - A string. Two digit sheet number.
+    """
+    lines = ["%s (%s): %s" % (name, format_size(size), reason) for name, size, reason in problems]
+    if total_size > get_sheet_budget(sheet_num):
+        lines.append("%s in total, the budget of the sheet is %s" % (format_size(total_size),
+                                                                   format_size(get_sheet_budget(sheet_num))))
+    return lines
\ No newline at end of file
@@ -1,9 +1,21 @@
-from subprocess import call, Popen, PIPE
+from tracing import call
 import os
 import sys
 import re
 import time
 import getopt
+import json
+import shlex
+import tempfile
+import student_preferences
+import feedback
+import tracing
+from solution_diff import SolutionDiffs, format_summary, format_diff
+from feedback_index import FeedbackIndex
+from svn_tools import SvnSnapshot, get_fingerprint
+from dir_snapshot import get_dir_snapshot
+from feedback_watcher import FeedbackWatcher
+from make_runner import MakePrefetcher, MakeCache, run_make_cached, DEFAULT_LIMITS
 
 
 # Color schemes
@@ -16,6 +28,15 @@ ENDC = '\033[0m'
 BOLD = '\033[1m'
 UNDERLINE = '\033[4m'
 
+# Known editors: command that opens a batch of files and name of the process
+EDITORS = {"subl": {"open": ["subl", "-b"], "process": "sublime_text"},
+           "code": {"open": ["code", "--reuse-window"], "process": "code"},
+           "gedit": {"open": ["gedit"], "process": "gedit"}}
+# Maximum number of seconds to wait for the editor to come up
+EDITOR_TIMEOUT = 5
+# Seconds a newly started editor gets to set up before the next command
+EDITOR_STARTUP_DELAY = 1
+
 class Correction:
 
     def __init__(self):
@@ -35,6 +56,30 @@ class Correction:
         self.next_index = 0
         self.directories = []
         self.exit = False
+        self.svn_snapshot = None
+        # Builds upcoming students in the background if set
+        self.make_prefetcher = None
+        # Replays make results for unchanged sources if set
+        self.make_cache = MakeCache()
+        # Time, cpu and memory limits for make if set
+        self.make_limits = None
+        # Command used to open files in the editor and name of its process
+        self.editor = "subl"
+        self.editor_command = EDITORS["subl"]["open"]
+        self.editor_process = EDITORS["subl"]["process"]
+        # Whether the last call to open_in_editor started the editor
+        self.editor_starting = False
+        # Progress of the correction of the current sheet, see load_session
+        self.session = {"finished": [], "options": {}, "checks": {}}
+        self.resume = False
+        # Validates the points whenever the feedback file is saved if set
+        self.watch = False
+        # Shows how the files of each student differ from the solution if set
+        self.solution_diff = False
+        # Diffs against the solution, see get_solution_diffs
+        self.solution_diffs = None
+        # Comments of all past feedback files, loaded by the first search
+        self.feedback_index = None
 
 
     def create_feedback(self, path):
@@ -45,28 +90,80 @@ class Correction:
         path - A string. Path to the blatt-xx directory of the student.
         """
         created = False
-        if not os.path.exists(path + "feedback-tutor.txt"):
+        snapshot = get_dir_snapshot(path)
+        if snapshot is not None and not snapshot.contains("feedback-tutor.txt"):
             call(["cp", "/home/natalie/tutorat/feedback-tutor.txt", path])
             created = True
         return created
 
 
+    def set_editor(self, editor):
+        """Sets the editor used to open files.
+
+        Arguments:
+        editor - A string. Name of a known editor or a command that opens the
+                 files given as arguments.
+        """
+        if editor in EDITORS:
+            self.editor = editor
+            self.editor_command = EDITORS[editor]["open"]
+            self.editor_process = EDITORS[editor]["process"]
+        else:
+            self.editor_command = shlex.split(editor)
+            self.editor = os.path.basename(self.editor_command[0])
+            # There is no way to know how an unknown editor signals readiness
+            self.editor_process = None
+
+
+    def open_in_editor(self, paths):
+        """Opens all given files and directories with a single editor call.
+
+        Arguments:
+        paths - A list of strings. Paths to open.
+        """
+        if paths:
+            self.editor_starting = bool(self.editor_process) and not self.is_editor_running()
+            call(self.editor_command + paths)
+
+
+    def is_editor_running(self):
+        with open(os.devnull, "w") as devnull:
+            return call(["pgrep", "-x", self.editor_process], stdout=devnull, stderr=devnull) == 0
+
+
+    def wait_for_editor(self):
+        """Waits until an editor started by the last open_in_editor can take
+        the next command. A running editor handles the commands it receives in
+        order, so there is nothing to wait for. A starting editor can't be
+        asked whether it is ready, so it gets EDITOR_STARTUP_DELAY seconds
+        after its process shows up, EDITOR_TIMEOUT seconds at most.
+        """
+        if not self.editor_starting:
+            return
+        self.editor_starting = False
+        deadline = time.time() + EDITOR_TIMEOUT
+        while not self.is_editor_running() and time.time() < deadline:
+            time.sleep(0.05)
+        time.sleep(max(0, min(EDITOR_STARTUP_DELAY, deadline - time.time())))
+
+
     def open_student_files(self, path, open_only_feedback=False):
-        """Opens the directory <path> and the contained files in sublime.
+        """Opens the directory <path> and the contained files in the editor.
 
         Arguments:
         path - A string. Path to the blatt-xx directory of the student.
         open_only_feedback - A boolean. Opens only feedback files if true.
         """
         path_to_student = re.sub(r"blatt-\d\d.*", "", path)
-        call(["subl", "-b", path_to_student])
+        paths = [path_to_student]
         # os.system("subl --command toggle_full_screen")
-        for file in os.listdir(path):
+        for file in get_dir_snapshot(path).names():
             if open_only_feedback:
                 if file == "feedback-tutor.txt":
-                    call(["subl", "-b", path + file])
+                    paths.append(path + file)
             elif self.open_makefile or file != "Makefile":
-                call(["subl", "-b", path + file])
+                paths.append(path + file)
+        self.open_in_editor(paths)
 
 
     def open_solution(self, path):
@@ -76,16 +173,66 @@ class Correction:
         Arguments:
         path - A string. Path to the solution directory for sheet-xx.
         """
-        dic = '{"cols": [0, 0.5, 1],"rows": [0, 1],"cells": [[0, 0, 1, 1], [1, 0, 2, 1]]}'
-        os.system("subl --command 'set_layout " + dic + "'")
+        if self.editor == "subl":
+            dic = '{"cols": [0, 0.5, 1],"rows": [0, 1],"cells": [[0, 0, 1, 1], [1, 0, 2, 1]]}'
+            os.system("subl --command 'set_layout " + dic + "'")
+        paths = []
         if os.path.isdir(path):
-            for file in os.listdir(path):
+            for file in sorted(os.listdir(path)):
                 if self.open_makefile or file != "Makefile":
-                    call(["subl", "-b", path + file])
+                    paths.append(path + file)
         # Open common-mistakes
         path_common_mistakes = "/home/natalie/tutorat/common-mistakes.txt"
         if os.path.exists(path_common_mistakes):
-            call(["subl", "-b", path_common_mistakes])
+            paths.append(path_common_mistakes)
+        self.open_in_editor(paths)
+
+
+    def print_solution_diff(self, path):
+        """Prints how much each file of the student differs from the file of
+        the solution with the same name.
+
+        Arguments:
+        path - A string. Path to the blatt-xx directory of the student.
+        """
+        diffs = self.solution_diffs.get_diffs(path)
+        if diffs:
+            print(OKBLUE + "Differences to the solution:" + ENDC)
+        for line in format_summary(diffs):
+            print("    %s" % line)
+
+
+    def get_solution_diffs(self):
+        """Returns the diffs against the solution. Without --solution_diff
+        they are only needed on request and computed in this process, since
+        other threads may be running already.
+        """
+        if self.solution_diffs is None:
+            self.solution_diffs = SolutionDiffs(self.solution_path + "blatt-" + self.sheet_num + "/", jobs=0)
+        return self.solution_diffs
+
+
+    def open_solution_diff(self, path):
+        """Writes the token diffs of the files of the student against the
+        solution to a temporary file and opens it in the editor.
+
+        Arguments:
+        path - A string. Path to the blatt-xx directory of the student.
+        """
+        solution_diffs = self.get_solution_diffs()
+        # The student files may have been edited since the precomputation
+        solution_diffs.discard(path)
+        diffs = solution_diffs.get_diffs(path)
+        if not diffs:
+            print(WARNING + "None of the files has a counterpart in the solution." + ENDC)
+            return
+        student = os.path.basename(os.path.normpath(re.sub(r"blatt-\d\d.*", "", path)))
+        # A fresh file, since a fixed name in /tmp could be a planted symlink
+        fd, path_to_diff = tempfile.mkstemp(prefix="tutorage-diff-%s-blatt-%s-" % (student, self.sheet_num),
+                                            suffix=".txt")
+        with os.fdopen(fd, "wb") as file:
+            file.write("\n".join([format_diff(name, diff) for name, diff in diffs]).encode("utf-8"))
+        self.open_in_editor([path_to_diff])
 
 
     def run_make(self, path):
@@ -94,7 +241,49 @@ class Correction:
         Arguments:
         path - A string. Path to the blatt-xx directory of the student.
         """
-        call(["make", "test", "checkstyle", "compile", "clean", "-C", path])
+        output, returncode, cached = run_make_cached(path, self.make_cache, echo=True, limits=self.make_limits)
+        if cached:
+            print(OKBLUE + "Sources unchanged, replaying the cached make output:" + ENDC)
+            print(output.rstrip("\n"))
+        elif "*** make stopped:" in output:
+            # The reason for killing make isn't part of the echoed output
+            print(FAIL + output.rstrip("\n").split("\n")[-1] + ENDC)
+        if returncode != 0:
+            print(FAIL + "make exited with status %d" % returncode + ENDC)
+        # A prefetched result for this student is outdated now
+        if self.make_prefetcher:
+            self.make_prefetcher.discard(path)
+
+
+    def print_make_result(self, path):
+        """Prints the output of the background build of the student. Waits for
+        the build if it isn't finished yet.
+
+        Arguments:
+        path - A string. Path to the blatt-xx directory of the student.
+        """
+        if not self.make_prefetcher.is_ready(path):
+            print(OKBLUE + "Waiting for make..." + ENDC)
+        output, returncode, cached = self.make_prefetcher.get_result(path)
+        if cached:
+            print(OKBLUE + "Sources unchanged, replaying the cached make output:" + ENDC)
+        print(output.rstrip("\n"))
+        if returncode != 0:
+            print(FAIL + "make exited with status %d" % returncode + ENDC)
+
+
+    def prefetch_make(self):
+        """Starts background builds for the current and the next students."""
+        paths = []
+        index = self.curr_index
+        while index < len(self.directories) and len(paths) <= self.make_prefetcher.lookahead:
+            if "." not in self.directories[index]:
+                path_to_sheet = self.directory_path + self.directories[index] + "/blatt-" + self.sheet_num + "/"
+                if os.path.isdir(path_to_sheet) and not (self.resume and
+                                                         self.directories[index] in self.session["finished"]):
+                    paths.append(path_to_sheet)
+            index += 1
+        self.make_prefetcher.prefetch(paths)
 
 
     def is_dir_clean(self, path):
@@ -103,10 +292,11 @@ class Correction:
         Arguments:
         path - A string. Path to the blatt-xx directory of the student.
         """
-        if not os.path.isdir(path):
+        snapshot = get_dir_snapshot(path)
+        if snapshot is None:
             return []
         strange_files = []
-        for file in os.listdir(path):
+        for file in snapshot.names():
             if ".o" in file or "." not in file and "Makefile" != file:
                 strange_files.append(file)
         return strange_files
@@ -125,9 +315,10 @@ class Correction:
         Arguments:
         path - A string. Path to the blatt-xx directory of the student.
         """
+        snapshot = get_dir_snapshot(path)
         missing_files = []
         for file in file_list:
-            if not os.path.exists(path + file):
+            if snapshot is None or not snapshot.contains(file):
                 missing_files.append(file)
         return missing_files
 
@@ -139,23 +330,40 @@ class Correction:
         Arguments:
         path - A string. Path to the blatt-xx directory of the student.
         """
-        point_errors = []
-        if os.path.exists(path + "feedback-tutor.txt"):
-            with open(path + "feedback-tutor.txt") as file:
-                lines = file.readlines()
-                total_points = 0
-                for line in lines:
-                    if re.match(r"^/\d+", line, re.MULTILINE):
-                        point_errors.append(line[:-1])
-                    points_match = re.match(r"^([\d\.]+)/(\d+)", line, re.MULTILINE)
-                    if points_match:
-                        if points_match.group(2) != "20":
-                            total_points += float(points_match.group(1))
-                        elif total_points != float(points_match.group(1)):
-                            point_errors.append("Expected: %.1f, Actual: %s" % (total_points, points_match.group(1)))
+        parsed_feedback = feedback.parse_feedback(path + "feedback-tutor.txt")
+        if parsed_feedback is None:
+            return ["No feedback-tutor.txt"]
+        return list(parsed_feedback.errors)
+
+
+    def get_points(self, path):
+        """Returns the total points given in feedback-tutor.txt or None.
+
+        Arguments:
+        path - A string. Path to the blatt-xx directory of the student.
+        """
+        parsed_feedback = feedback.parse_feedback(path + "feedback-tutor.txt")
+        return parsed_feedback.declared_total if parsed_feedback else None
+
+
+    def print_points_status(self, path):
+        """Prints the points status of a feedback file. Used by the watch mode
+        whenever the file is saved.
+
+        Arguments:
+        path - A string. Path to a feedback-tutor.txt file.
+        """
+        parsed_feedback = feedback.parse_feedback(path)
+        if parsed_feedback is None:
+            return
+        total = parsed_feedback.computed_total
+        if parsed_feedback.errors:
+            print(FAIL + "\nPoints: %.1f so far, problems: %s" % (total, "; ".join(parsed_feedback.errors)) + ENDC)
+        elif parsed_feedback.declared_total is None:
+            print(WARNING + "\nPoints: %.1f so far, no total given yet" % total + ENDC)
         else:
-            point_errors.append("No feedback-tutor.txt")
-        return point_errors
+            print(OKGREEN + "\nPoints: %.1f/%d, all points assigned" % (parsed_feedback.declared_total,
+                                                                   feedback.TOTAL_POINTS) + ENDC)
 
 
     def print_check_points(self, path):
@@ -174,22 +382,29 @@ class Correction:
         path - A string. Path to the blatt-xx directory of the student.
         """
         path_to_student = re.sub(r"blatt-\d\d.*", "", path)
-        p = Popen(["svn", "diff", path_to_student], stdin=PIPE, stdout=PIPE, stderr=PIPE)
-        output, err = p.communicate()
-        lines = output.split("\n")
-        changed_files = []
-        for line in lines:
-            changed_file = re.match(r"^\+\+\+\s(.*)\t", line, re.MULTILINE)
-            if changed_file:
-                changed_files.append((changed_file.group(1), []))
-            change = re.match(r"^([\+\-][^\+\-].*)$", line, re.MULTILINE)
-            if change:
-                changed_files[-1][1].append(change.group(1))
-        return changed_files
+        path_to_abgaben, student = os.path.split(os.path.normpath(path_to_student))
+        return self.get_svn_snapshot(path_to_abgaben + "/").get_diff(student)
+
+
+    def get_svn_snapshot(self, path):
+        """Returns the snapshot of svn status and svn diff that all students in
+        <path> share.
+
+        Arguments:
+        path - A string. Path to the directory of all students.
+        """
+        if self.svn_snapshot is None or self.svn_snapshot.path != path:
+            self.svn_snapshot = SvnSnapshot(path)
+        return self.svn_snapshot
 
 
     def print_svn_diff(self, path):
         changed_files = self.run_svn_diff(path)
+        path_to_abgaben, student = os.path.split(os.path.normpath(re.sub(r"blatt-\d\d.*", "", path)))
+        svn_error = self.get_svn_snapshot(path_to_abgaben + "/").get_error(student)
+        if svn_error:
+            print(FAIL + "svn failed, the changes are unknown: %s" % svn_error + ENDC)
+            return True
         for i in range(len(changed_files)):
             print(WARNING + "Wait a second! There have been some changes." + ENDC)
             print(BOLD + "    In %s:" % changed_files[i][0] + ENDC)
@@ -204,20 +419,114 @@ class Correction:
         Arguments:
         student - username of the student
         """
-        path = "/home/natalie/tutorat/student_preferences.txt"
-        preferences = []
+        return student_preferences.get_student_preferences(student)
+
+
+    def get_session_path(self):
+        return "/home/natalie/tutorat/session-blatt-" + self.sheet_num + ".json"
+
+
+    def load_session(self):
+        """Loads the checkpoint of the correction of the current sheet. It
+        lists the finished students and the options and check results of
+        each student.
+        """
+        path = self.get_session_path()
         if os.path.exists(path):
             with open(path) as file:
-                lines = file.readlines()
-                found_student = False
-                for i, line in enumerate(lines):
-                    if line[:3] == "---" and found_student:
-                        return preferences
-                    elif line.strip() == student:
-                        found_student = True
-                    elif found_student:
-                        preferences.append(line.strip())
-        return []
+                try:
+                    session = json.load(file)
+                    # Session files of older versions lack some of the keys
+                    self.session = dict((key, session.get(key, default)) for key, default in self.session.items())
+                except (ValueError, AttributeError):
+                    print(WARNING + "Ignoring corrupt session file %s" % path + ENDC)
+
+
+    def save_session(self):
+        try:
+            with open(self.get_session_path(), "w") as file:
+                json.dump(self.session, file, indent=1, sort_keys=True)
+        except IOError:
+            print(WARNING + "Could not save the session to %s" % self.get_session_path() + ENDC)
+
+
+    def get_options(self):
+        return {"only_feedback": self.only_feedback, "no_terminal": self.no_terminal,
+                "no_solution": self.no_solution, "no_make": self.no_make}
+
+
+    def set_options(self, options):
+        self.only_feedback = options.get("only_feedback", self.only_feedback)
+        self.no_terminal = options.get("no_terminal", self.no_terminal)
+        self.no_solution = options.get("no_solution", self.no_solution)
+        self.no_make = options.get("no_make", self.no_make)
+
+
+    def record_student(self, student, checks):
+        """Stores the options and check results of <student> in the session
+        and marks him as finished if the tutor moved on to a later student.
+
+        Arguments:
+        student - A string. Name of the student directory.
+        checks - A dictionary. Results of the final checks.
+        """
+        checks["fingerprint"] = list(get_fingerprint(self.directory_path + student))
+        self.session["options"][student] = self.get_options()
+        self.session["checks"][student] = checks
+        if not self.exit and self.next_index > self.curr_index and student not in self.session["finished"]:
+            self.session["finished"].append(student)
+        self.save_session()
+
+
+    def get_recorded_checks(self, student):
+        """Returns the recorded results of the final checks of <student> if
+        nothing in his working copy changed since, None otherwise.
+
+        Arguments:
+        student - A string. Name of the student directory.
+        """
+        checks = self.session["checks"].get(student)
+        if checks and checks.get("fingerprint") == list(get_fingerprint(self.directory_path + student)):
+            return checks
+        return None
+
+
+    def get_next_index(self, start):
+        """Returns the index of the next student to check starting at <start>.
+        Finished students are skipped when resuming a session.
+
+        Arguments:
+        start - An integer. Index into self.directories.
+        """
+        index = start
+        while (self.resume and index < len(self.directories)
+               and self.directories[index] in self.session["finished"]):
+            index += 1
+        return index
+
+
+    def search_feedback(self, query):
+        """Prints the past comments that match all words of <query>, most
+        relevant first. The words may be prefixes.
+
+        Arguments:
+        query - A string. Words to search for.
+        """
+        start = time.time()
+        # The feedback of each student is added once he is done, see check_student
+        if self.feedback_index is None:
+            self.feedback_index = FeedbackIndex()
+            self.feedback_index.update()
+        results = self.feedback_index.search(query)
+        if not results:
+            print(WARNING + "No past comments found for '%s'." % query + ENDC)
+            return
+        print(OKBLUE + "Past comments for '%s' (%.0fms):" % (query, (time.time() - start) * 1000) + ENDC)
+        for comment, count in results:
+            # Python 2 can't print unicode to a pipe
+            if not isinstance(comment, str):
+                comment = comment.encode("utf-8")
+            print("    [%dx] %s" % (count, comment))
 
 
     def open_gnome_terminal(self, path):
@@ -259,7 +568,7 @@ class Correction:
                 self.exit = True
                 wait = False
             elif user_input == "":
-                self.next_index = self.curr_index + 1
+                self.next_index = self.get_next_index(self.curr_index + 1)
                 wait = False
 
             # Options for the following corrections
@@ -288,13 +597,17 @@ class Correction:
                 print(BOLD + "  Press ENTER to continue." + ENDC)
                 print(BOLD + "  Options (proceed after input): back, recheck, restart, quit." + ENDC)
                 print(BOLD + "  Options (wait after input): only_feedback, no_terminal, no_solution, no_make, reset, help." + ENDC)
-                print(BOLD + "  Run commands: run_make, open_terminal, check." + ENDC)
+                print(BOLD + "  Run commands: run_make, open_terminal, check, diff, search <words>." + ENDC)
 
             # Options for running commands
             elif user_input == "run_make":
                 self.run_make(path_to_sheet)
             elif user_input == "open_terminal":
                 self.open_gnome_terminal(path_to_sheet)
+            elif user_input.startswith("search "):
+                self.search_feedback(user_input[len("search "):].strip())
+            elif user_input == "diff":
+                self.open_solution_diff(path_to_sheet)
             elif user_input == "check":
                 self.print_svn_diff(path_to_sheet)
                 self.print_is_dir_clean(path_to_sheet)
@@ -314,76 +627,123 @@ class Correction:
         print(HEADER + "\n" + "*"*80 + ENDC)
         print(OKBLUE + BOLD + "Checking student %s" % student + ENDC)
 
-        if os.path.isdir(path_to_sheet):
+        # Build this and the next students in the background
+        if self.make_prefetcher and not self.quick_version and not self.no_make:
+            with tracing.phase("prefetch"):
+                self.prefetch_make()
+
+        if get_dir_snapshot(path_to_sheet) is not None:
             dir_exists = True
 
             # Print student preferences
-            preferences = self.get_student_preferences(student)
+            with tracing.phase("preferences"):
+                preferences = self.get_student_preferences(student)
             for preference in preferences:
                 print(BOLD + preference + ENDC)
 
             # Create feedback-tutor.txt if it doesn't exist
-            if self.create_feedback(path_to_sheet):
+            with tracing.phase("create_feedback"):
+                created = self.create_feedback(path_to_sheet)
+            if created:
                 print(OKGREEN + "Created feedback-tutor.txt." + ENDC)      
 
-            # Open directory and the contained files for each student in sublime
+            # Open directory and the contained files for each student in the editor
             only_feedback = self.quick_version or self.only_feedback
-            self.open_student_files(path_to_sheet, open_only_feedback=only_feedback)
-            time.sleep(1)
+            with tracing.phase("editor"):
+                self.open_student_files(path_to_sheet, open_only_feedback=only_feedback)
+                self.wait_for_editor()
 
             # Open the solution using a double vertical layout
             if (not self.quick_version and not self.no_solution):
-                self.open_solution(path_to_solution)
+                with tracing.phase("solution"):
+                    self.open_solution(path_to_solution)
+
+            # Show how the files differ from the solution
+            if self.solution_diff:
+                with tracing.phase("solution_diff"):
+                    self.print_solution_diff(path_to_sheet)
 
             # Run make test, checkstyle compile and clean
             if (not self.quick_version and not self.no_make):
-                self.run_make(path_to_sheet)
-            
+                with tracing.phase("make"):
+                    if self.make_prefetcher:
+                        self.print_make_result(path_to_sheet)
+                    else:
+                        self.run_make(path_to_sheet)
+
             # Check whether the directory was cleaned properly
-            files = self.is_dir_clean(path_to_sheet)
+            with tracing.phase("checks"):
+                files = self.is_dir_clean(path_to_sheet)
             for file in files:
                 print(WARNING + "Should the file %s be here?" % file + ENDC)
 
             # Check whether the student has uploaded a erfahrungen.txt and the Makefile file
-            files = self.is_file_in_dir(path_to_sheet, ["erfahrungen.txt", "Makefile"])
+            with tracing.phase("checks"):
+                files = self.is_file_in_dir(path_to_sheet, ["erfahrungen.txt", "Makefile"])
             for file in files:
                 print(WARNING + "Student %s doesn't have a %s in his repository." % (student, file) + ENDC)
 
             # Open a new gnome-terminal tab in the students blatt-xx directory
             if (not self.quick_version and not self.no_terminal):
-                self.open_gnome_terminal(path_to_sheet)
+                with tracing.phase("terminal"):
+                    self.open_gnome_terminal(path_to_sheet)
         
         else:
             # If the directory doesn't exist, only open super-directory and wait for user input
             dir_exists = False
             print(FAIL + "Student %s doesn't have a directory blatt-%s in his repository." % (student, self.sheet_num) + ENDC)
-            call(["subl", self.directory_path + student])
+            with tracing.phase("editor"):
+                self.open_in_editor([self.directory_path + student])
+
+        # Validate the points in the background whenever the feedback is saved
+        watcher = None
+        if dir_exists and self.watch:
+            watcher = FeedbackWatcher(path_to_sheet + "feedback-tutor.txt", self.print_points_status)
+            watcher.start()
 
         # Process user_input. 
-        self.process_user_input()
+        with tracing.phase("input"):
+            self.process_user_input()
 
         if (dir_exists):
             # Check whether points were assigned correctly, if changes were made, if directory is clean.
-            errors = self.print_check_points(path_to_sheet)
-            errors = self.print_svn_diff(path_to_sheet) or errors
-            errors = self.print_is_dir_clean(path_to_sheet) or errors
+            checks = self.get_recorded_checks(student)
+            if checks and not checks["errors"]:
+                print(OKGREEN + "Nothing changed since the last check of %s." % student + ENDC)
+                errors = False
+            else:
+                with tracing.phase("final_checks"):
+                    errors = self.print_check_points(path_to_sheet)
+                    errors = self.print_svn_diff(path_to_sheet) or errors
+                    errors = self.print_is_dir_clean(path_to_sheet) or errors
             if errors:
-                self.process_user_input()
+                with tracing.phase("input"):
+                    self.process_user_input()
+            self.record_student(student, {"errors": errors, "points": self.get_points(path_to_sheet)})
+            if self.feedback_index:
+                self.feedback_index.update_file(path_to_sheet + "feedback-tutor.txt")
+            if watcher:
+                watcher.stop()
+        else:
+            self.record_student(student, {"errors": True, "points": None})
 
         # Close the sublime window
-        call(["subl", "--command", "close_window"])
-        time.sleep(1)
+        if self.editor == "subl":
+            with tracing.phase("editor"):
+                call(["subl", "--command", "close_window"])
+                self.wait_for_editor()
 
 
     def check_all_students(self):
         while self.curr_index < len(self.directories):
             if "." not in self.directories[self.curr_index]:
-                self.check_student()
+                with tracing.phase("student", self.directories[self.curr_index]):
+                    self.check_student()
                 if self.exit:
                     exit()
                 self.curr_index = self.next_index
             else:
-                self.curr_index += 1
+                self.curr_index = self.get_next_index(self.curr_index + 1)
 
 
     def print_usage_and_exit(self):
@@ -392,8 +752,9 @@ class Correction:
 
 
     def main(self):
-        options = "qftsmc:h"
-        long_options = ["quick", "feedback_only", "no_terminal", "no_solution", "no_make", "check_student", "help"]
+        options = "qftsmc:p:j:nle:rwdh"
+        long_options = ["quick", "feedback_only", "no_terminal", "no_solution", "no_make", "check_student",
+                        "prefetch=", "make_jobs=", "no_cache", "limits", "timeout=", "max_procs=", "editor=", "resume", "watch", "solution_diff", "trace=", "help"]
         try:
             opts, args = getopt.gnu_getopt(sys.argv, options, long_options)
         except getopt.GetoptError:
@@ -401,6 +762,11 @@ class Correction:
             self.print_usage_and_exit()
 
         check_only_student = ""
+        prefetch = 0
+        make_jobs = 1
+        timeout = None
+        max_procs = None
+        trace_path = None
         for opt, opt_args in opts:
             if opt == '-q' or opt == '--quick': self.quick_version = True
             elif opt == '-f' or opt == '--feedback_only': self.only_feedback = True
@@ -408,6 +774,25 @@ class Correction:
             elif opt == '-s' or opt == "--no_solution": self.no_solution = True
             elif opt == '-m' or opt == "--no_make": self.no_make = True
             elif opt == '-c' or opt == "--check_student": check_only_student = opt_args;
+            elif opt == '-p' or opt == "--prefetch":
+                if not opt_args.isdigit(): self.print_usage_and_exit()
+                prefetch = int(opt_args)
+            elif opt == '-j' or opt == "--make_jobs":
+                if not opt_args.isdigit() or int(opt_args) < 1: self.print_usage_and_exit()
+                make_jobs = int(opt_args)
+            elif opt == '-n' or opt == "--no_cache": self.make_cache = None
+            elif opt == '-l' or opt == "--limits": self.make_limits = dict(DEFAULT_LIMITS)
+            elif opt == '-e' or opt == "--editor": self.set_editor(opt_args)
+            elif opt == '-r' or opt == "--resume": self.resume = True
+            elif opt == '-w' or opt == "--watch": self.watch = True
+            elif opt == '-d' or opt == "--solution_diff": self.solution_diff = True
+            elif opt == "--timeout":
+                if not opt_args.isdigit() or int(opt_args) < 1: self.print_usage_and_exit()
+                timeout = int(opt_args)
+            elif opt == "--max_procs":
+                if not opt_args.isdigit() or int(opt_args) < 1: self.print_usage_and_exit()
+                max_procs = int(opt_args)
+            elif opt == "--trace": trace_path = opt_args
             elif opt == '-h' or opt == "--help":
                 string = ("Usage: python ./correction_script.py <sheet number> [arguments]\n\n"
                           "Arguments:\n"
@@ -416,6 +801,17 @@ class Correction:
                           "-t, --no_terminal\t" + "Don't open a new terminal.\n"
                           "-s, --no_solution\t" + "Don't open the solution.\n"
                           "-m, --no_make\t\t" + "Don't run make.\n"
+                          "-p, --prefetch <n>\t" + "Build the next <n> students in the background.\n"
+                          "-j, --make_jobs <n>\t" + "Run <n> background builds in parallel.\n"
+                          "-n, --no_cache\t\t" + "Always run make, don't replay cached results.\n"
+                          "-l, --limits\t\t" + "Run make with time, cpu and memory limits.\n"
+                          "--timeout <s>\t\t" + "Kill make after <s> seconds (implies --limits).\n"
+                          "--max_procs <n>\t\t" + "Limit the processes of your user, including the desktop, to <n> while make runs (implies --limits).\n"
+                          "-e, --editor <cmd>\t" + "Editor to open the files with (subl, code, gedit or a command).\n"
+                          "-r, --resume\t\t" + "Continue the last session with the first unfinished student.\n"
+                          "-w, --watch\t\t" + "Check the points whenever feedback-tutor.txt is saved.\n"
+                          "-d, --solution_diff\t" + "Compare the files with the solution in the background and show a summary.\n"
+                          "--trace <file>\t\t" + "Append the duration of each phase and command to <file> (JSONL).\n"
                           "-h, --help\t\t" + "Show help options.\n")
                 print(BOLD + string + ENDC)
                 sys.exit(2)
@@ -425,6 +821,9 @@ class Correction:
         if len(args) != 2:
             self.print_usage_and_exit()
 
+        if trace_path:
+            tracing.enable(trace_path, "correction_script")
+
         self.sheet_num = args[1].zfill(2)
         self.directories = os.listdir(self.directory_path)
         self.directories.sort()
@@ -434,15 +833,47 @@ class Correction:
             print(WARNING + "Strange number of directories. Please check:" + ENDC)
             print(self.directories)
 
-        if len(check_only_student) > 0:
-            if check_only_student in self.directories:
-                self.curr_index = self.directories.index(check_only_student)
-                self.check_student()
+        if timeout:
+            self.make_limits = self.make_limits or dict(DEFAULT_LIMITS)
+            self.make_limits["timeout"] = timeout
+        if max_procs:
+            self.make_limits = self.make_limits or dict(DEFAULT_LIMITS)
+            self.make_limits["processes"] = max_procs
+
+        # Start the worker processes before any other threads
+        if self.solution_diff:
+            self.solution_diffs = SolutionDiffs(self.solution_path + "blatt-" + self.sheet_num + "/")
+            self.solution_diffs.precompute([self.directory_path + student + "/blatt-" + self.sheet_num + "/"
+                                            for student in self.directories if "." not in student])
+
+        if prefetch > 0:
+            self.make_prefetcher = MakePrefetcher(prefetch, make_jobs, self.make_cache, self.make_limits)
+
+        self.load_session()
+        if self.resume:
+            finished = self.session["finished"]
+            self.curr_index = self.get_next_index(0)
+            # Continue with the options of the last finished student
+            if finished and finished[-1] in self.session["options"]:
+                self.set_options(self.session["options"][finished[-1]])
+            print(OKBLUE + BOLD + "Resuming session: %d students finished." % len(finished) + ENDC)
+
+        try:
+            if len(check_only_student) > 0:
+                if check_only_student in self.directories:
+                    self.curr_index = self.directories.index(check_only_student)
+                    with tracing.phase("student", check_only_student):
+                        self.check_student()
+                else:
+                    print("Student not known.")
+                    sys.exit(2)
             else:
-                print("Student not known.")
-                sys.exit(2)
-        else:
-            self.check_all_students()
+                self.check_all_students()
+        finally:
+            if self.solution_diffs:
+                self.solution_diffs.close()
+            if self.make_prefetcher:
+                self.make_prefetcher.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,113 @@
+import os
+import stat
+
+
+# Snapshots by path together with the mtime of the directory
+_cache = {}
+
+
+class DirEntry:
+    """Name, size, type and mtime of a file in a snapshot."""
+
+    def __init__(self, name, size, is_dir, mtime, is_link=False):
+        self.name = name
+        self.size = size
+        self.is_dir = is_dir
+        self.mtime = mtime
+        self.is_link = is_link
+
+
+class DirSnapshot:
+    """Contents of a directory read with a single scan."""
+
+    def __init__(self, path, mtime):
+        self.path = path
+        self.mtime = mtime
+        self.entries = {}
+        for entry in scan(path):
+            self.entries[entry.name] = entry
+
+
+    def names(self):
+        return sorted(self.entries)
+
+
+    def contains(self, name):
+        return name in self.entries
+
+
+    def get(self, name):
+        return self.entries.get(name)
+
+
+def scan(path, follow_symlinks=True):
+    """Returns a list of DirEntry objects for all files in <path>. Uses
+    os.scandir where available, which gets the file types from the directory
+    listing itself.
+
+    Arguments:
+    path - A string. Path to the directory.
+    follow_symlinks - A boolean. Describes the targets of symbolic links if
+                      true, otherwise the links themselves.
+    """
+    entries = []
+    if hasattr(os, "scandir"):
+        for entry in os.scandir(path):
+            try:
+                st = entry.stat(follow_symlinks=follow_symlinks)
+            except OSError:
+                continue
+            entries.append(DirEntry(entry.name, st.st_size, stat.S_ISDIR(st.st_mode), st.st_mtime,
+                                    stat.S_ISLNK(st.st_mode)))
+    else:
+        for name in os.listdir(path):
+            try:
+                st = os.stat(os.path.join(path, name)) if follow_symlinks else os.lstat(os.path.join(path, name))
+            except OSError:
+                continue
+            entries.append(DirEntry(name, st.st_size, stat.S_ISDIR(st.st_mode), st.st_mtime,
+                                    stat.S_ISLNK(st.st_mode)))
+    return entries
+
+
+def get_dir_snapshot(path, refresh=False):
+    """Returns a DirSnapshot of <path> or None if it isn't a directory.
+    The directory is only scanned again if files were added or removed since
+    the last scan, so sizes and mtimes can be outdated unless <refresh> is
+    set.
+
+    Arguments:
+    path - A string. Path to the directory.
+    refresh - A boolean. Always scans the directory if true.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        _cache.pop(path, None)
+        return None
+    if not stat.S_ISDIR(st.st_mode):
+        return None
+    if refresh or path not in _cache or _cache[path].mtime != st.st_mtime:
+        try:
+            _cache[path] = DirSnapshot(path, st.st_mtime)
+        except OSError:
+            return None
+    return _cache[path]
+
+
+def snapshot_tree(path, sheet_num, refresh=False):
+    """Scans the blatt-<sheet_num> directories of all students in <path> in
+    one walk and fills the cache used by get_dir_snapshot.
+    Returns a dictionary that maps each student to his snapshot or None.
+
+    Arguments:
+    path - A string. Path to the directory of all students.
+    sheet_num - A string. Two digit sheet number.
+    refresh - A boolean. Scans directories even if they are cached if true.
+    """
+    snapshots = {}
+    for entry in scan(path):
+        if entry.is_dir and "." not in entry.name:
+            path_to_sheet = path + entry.name + "/blatt-" + sheet_num + "/"
+            snapshots[entry.name] = get_dir_snapshot(path_to_sheet, refresh)
+    return snapshots
\ No newline at end of file
@@ -0,0 +1,87 @@
+import os
+import re
+
+
+# Maximum number of points of a sheet. A line "x/20" declares the total.
+TOTAL_POINTS = 20
+
+UNFILLED_PATTERN = re.compile(r"^/\d+")
+POINTS_PATTERN = re.compile(r"^([\d\.]+)/(\d+)")
+
+# Parsed feedback files by path with the mtime and size they were parsed at
+_cache = {}
+
+
+class Feedback:
+    """Points given in a feedback-tutor.txt file."""
+
+    def __init__(self):
+        # Tuples of awarded points, maximum points and line of each exercise
+        self.exercises = []
+        # Lines of the form "/x" where no points were given yet
+        self.unfilled = []
+        # Sum of the points of all exercises
+        self.computed_total = 0.0
+        # Points of the first line of the form "x/20" or None
+        self.declared_total = None
+        # Tuples of the expected and the declared total that don't match
+        self.mismatches = []
+        # Messages for everything that is wrong, in the order of the file
+        self.errors = []
+
+
+def parse_feedback_lines(lines):
+    """Parses the points of a feedback file in a single pass.
+    Returns a Feedback object.
+
+    Arguments:
+    lines - An iterable of strings. Lines of feedback-tutor.txt.
+    """
+    feedback = Feedback()
+    for line in lines:
+        # Only lines starting with a digit or a slash can contain points
+        if not line or line[0] not in "/0123456789.":
+            continue
+        line = line.rstrip("\n")
+        if UNFILLED_PATTERN.match(line):
+            feedback.unfilled.append(line)
+            feedback.errors.append(line)
+        points_match = POINTS_PATTERN.match(line)
+        if not points_match:
+            continue
+        try:
+            points = float(points_match.group(1))
+        except ValueError:
+            feedback.errors.append("Invalid points: %s" % line)
+            continue
+        if int(points_match.group(2)) != TOTAL_POINTS:
+            feedback.exercises.append((points, int(points_match.group(2)), line))
+            feedback.computed_total += points
+        else:
+            if feedback.declared_total is None:
+                feedback.declared_total = points
+            # Check whether the sum of the points was computed correctly
+            if feedback.computed_total != points:
+                feedback.mismatches.append((feedback.computed_total, points_match.group(1)))
+                feedback.errors.append("Expected: %.1f, Actual: %s" % (feedback.computed_total,
+                                                                       points_match.group(1)))
+    return feedback
+
+
+def parse_feedback(path):
+    """Returns the parsed feedback file at <path> or None if it doesn't exist.
+    The file is only read again if its mtime or size changed.
+
+    Arguments:
+    path - A string. Path to a feedback-tutor.txt file.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        _cache.pop(path, None)
+        return None
+    key = (stat.st_mtime, stat.st_size)
+    if path not in _cache or _cache[path][0] != key:
+        with open(path) as file:
+            _cache[path] = (key, parse_feedback_lines(file))
+    return _cache[path][1]
\ No newline at end of file
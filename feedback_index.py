@@ -0,0 +1,225 @@
+import os
+import io
+import re
+import json
+import glob
+import math
+import bisect
+import feedback
+
+
+# Color schemes
+WARNING = '\033[93m'
+ENDC = '\033[0m'
+
+# Feedback of the current semester and of past semesters (one directory per
+# semester with the same layout as abgaben)
+PATH = "/home/natalie/tutorat/abgaben/"
+ARCHIVE_PATH = "/home/natalie/tutorat/archiv/"
+COMMON_MISTAKES_PATH = "/home/natalie/tutorat/common-mistakes.txt"
+# Lines of the template are in every feedback file and aren't indexed
+TEMPLATE_PATH = "/home/natalie/tutorat/feedback-tutor.txt"
+# Indexed lines of every file with the mtime and size they were read at
+INDEX_PATH = "/home/natalie/tutorat/feedback_index.json"
+# Number of results of a search
+MAX_RESULTS = 10
+# Comments from common-mistakes.txt rank as if they were used this often
+COMMON_MISTAKES_WEIGHT = 3
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    return [word.lower() for word in WORD_PATTERN.findall(text)]
+
+
+def read_lines(path):
+    """Returns the stripped non-empty lines of a file without the points
+    lines, or None if the file can't be read.
+
+    Arguments:
+    path - A string. Path to a feedback-tutor.txt or common-mistakes.txt.
+    """
+    try:
+        with io.open(path, encoding="utf-8", errors="replace") as file:
+            lines = [line.strip() for line in file]
+    except (IOError, OSError):
+        return None
+    return [line for line in lines if line and not feedback.POINTS_PATTERN.match(line)
+            and not feedback.UNFILLED_PATTERN.match(line)]
+
+
+def find_feedback_files():
+    """Returns the paths of all feedback files of this and past semesters and
+    of common-mistakes.txt.
+    """
+    paths = glob.glob(PATH + "*/blatt-*/feedback-tutor.txt")
+    paths += glob.glob(ARCHIVE_PATH + "*/*/blatt-*/feedback-tutor.txt")
+    if os.path.exists(COMMON_MISTAKES_PATH):
+        paths.append(COMMON_MISTAKES_PATH)
+    return sorted(paths)
+
+
+class FeedbackIndex:
+    """Inverted index from words to the comments of all feedback files. Each
+    distinct line is a comment; it remembers in how many files it was used.
+    Only files whose mtime or size changed are read again on update.
+    """
+
+    def __init__(self, index_path=INDEX_PATH):
+        self.index_path = index_path
+        # Path -> {"mtime", "size", "lines"} of every indexed file
+        self.files = {}
+        # Comment -> number of files that use it
+        self.counts = {}
+        # Word -> {comment: number of occurrences of the word in the comment}
+        self.postings = {}
+        # Sorted words for the prefix search, None if it must be rebuilt
+        self.words = None
+        self.template = set(read_lines(TEMPLATE_PATH) or [])
+        self.load()
+
+
+    def load(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path) as file:
+            try:
+                files = json.load(file)
+            except ValueError:
+                return
+        for path, entry in files.items():
+            self.add_file(path, entry)
+
+
+    def save(self):
+        try:
+            with open(self.index_path, "w") as file:
+                json.dump(self.files, file)
+        except IOError as e:
+            print(WARNING + "Could not save the feedback index to %s: %s" % (self.index_path, e) + ENDC)
+
+
+    def add_file(self, path, entry):
+        self.files[path] = entry
+        weight = COMMON_MISTAKES_WEIGHT if path == COMMON_MISTAKES_PATH else 1
+        for line in set(entry["lines"]):
+            if line in self.template:
+                continue
+            if line not in self.counts:
+                self.counts[line] = 0
+                for word in tokenize(line):
+                    comments = self.postings.setdefault(word, {})
+                    if not comments:
+                        self.words = None
+                    comments[line] = comments.get(line, 0) + 1
+            self.counts[line] += weight
+
+
+    def remove_file(self, path):
+        entry = self.files.pop(path)
+        weight = COMMON_MISTAKES_WEIGHT if path == COMMON_MISTAKES_PATH else 1
+        for line in set(entry["lines"]):
+            if line not in self.counts:
+                continue
+            self.counts[line] -= weight
+            if self.counts[line] <= 0:
+                del self.counts[line]
+                for word in set(tokenize(line)):
+                    del self.postings[word][line]
+                    if not self.postings[word]:
+                        del self.postings[word]
+                        self.words = None
+
+
+    def read_file(self, path):
+        """Reads <path> again if its mtime or size changed since it was
+        indexed. Returns whether it was read.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        entry = self.files.get(path)
+        if entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            return False
+        lines = read_lines(path)
+        if lines is None:
+            return False
+        if entry:
+            self.remove_file(path)
+        self.add_file(path, {"mtime": stat.st_mtime, "size": stat.st_size, "lines": lines})
+        return True
+
+
+    def update(self):
+        """Reads all new and changed feedback files and forgets deleted ones.
+        Returns the number of files that were read.
+        """
+        paths = find_feedback_files()
+        read = 0
+        for path in paths:
+            if self.read_file(path):
+                read += 1
+        deleted = set(self.files) - set(paths)
+        for path in deleted:
+            self.remove_file(path)
+        if read or deleted:
+            self.save()
+        return read
+
+
+    def update_file(self, path):
+        """Reads a single feedback file again after it was saved.
+
+        Arguments:
+        path - A string. Path to a feedback-tutor.txt.
+        """
+        if self.read_file(path):
+            self.save()
+
+
+    def get_matching_words(self, prefix):
+        """Returns all indexed words starting with <prefix>."""
+        if self.words is None:
+            self.words = sorted(self.postings)
+        start = bisect.bisect_left(self.words, prefix)
+        end = bisect.bisect_left(self.words, prefix + u"\uffff")
+        return self.words[start:end]
+
+
+    def search(self, query, limit=MAX_RESULTS):
+        """Finds the comments that contain a word starting with each word of
+        <query>. Comments are ranked by tf-idf of the matching words, exact
+        matches before prefix matches, and by how often they were used.
+        Returns a list of tuples of the comment and its number of uses.
+
+        Arguments:
+        query - A string. One or more words or prefixes of words.
+        limit - An integer. Maximum number of results.
+        """
+        if isinstance(query, bytes):
+            query = query.decode("utf-8", "replace")
+        prefixes = tokenize(query)
+        if not prefixes or not self.counts:
+            return []
+        scores = None
+        for prefix in prefixes:
+            prefix_scores = {}
+            for word in self.get_matching_words(prefix):
+                comments = self.postings[word]
+                idf = math.log(1.0 + float(len(self.counts)) / len(comments))
+                if word != prefix:
+                    idf *= 0.5
+                for comment, occurrences in comments.items():
+                    prefix_scores[comment] = max(prefix_scores.get(comment, 0), occurrences * idf)
+            if scores is None:
+                scores = prefix_scores
+            else:
+                scores = dict((comment, score + prefix_scores[comment])
+                              for comment, score in scores.items() if comment in prefix_scores)
+            if not scores:
+                return []
+        ranked = sorted(scores, key=lambda comment: (-scores[comment] * (1 + math.log(self.counts[comment])),
+                                                     len(comment), comment))
+        return [(comment, self.counts[comment]) for comment in ranked[:limit]]
\ No newline at end of file
@@ -0,0 +1,78 @@
+import os
+import threading
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+
+# Seconds between two checks of the file if inotify isn't available
+POLL_INTERVAL = 0.5
+
+
+class FeedbackWatcher:
+    """Calls <callback> with the path of a file whenever it is saved.
+    Uses inotify through pyinotify if it is installed and polls the mtime of
+    the file otherwise.
+    """
+
+    def __init__(self, path, callback, interval=POLL_INTERVAL):
+        self.path = path
+        self.callback = callback
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.notifier = None
+
+
+    def start(self):
+        if pyinotify is not None:
+            try:
+                self.start_inotify()
+                return
+            except (OSError, pyinotify.WatchManagerError):
+                self.notifier = None
+        self.thread = threading.Thread(target=self.poll)
+        self.thread.daemon = True
+        self.thread.start()
+
+
+    def start_inotify(self):
+        watcher = self
+        class Handler(pyinotify.ProcessEvent):
+            def process_default(self, event):
+                # Editors often save by writing a new file and renaming it
+                if event.pathname == watcher.path:
+                    watcher.callback(watcher.path)
+        manager = pyinotify.WatchManager()
+        manager.add_watch(os.path.dirname(self.path), pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO,
+                          quiet=False)
+        self.notifier = pyinotify.ThreadedNotifier(manager, Handler())
+        self.notifier.daemon = True
+        self.notifier.start()
+
+
+    def get_state(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime, stat.st_size)
+
+
+    def poll(self):
+        state = self.get_state()
+        while not self.stop_event.wait(self.interval):
+            new_state = self.get_state()
+            if new_state != state:
+                state = new_state
+                if new_state is not None:
+                    self.callback(self.path)
+
+
+    def stop(self):
+        self.stop_event.set()
+        if self.notifier is not None:
+            self.notifier.stop()
+        if self.thread is not None:
+            self.thread.join()
\ No newline at end of file
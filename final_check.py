@@ -1,6 +1,8 @@
 # This script tells you:
 # - if the directory <student/blatt-xx> exists
 # - if the directory is cleaned (no .o files or files without ending)
+# - if there are binaries, core dumps or large files and if the sheet is
+#   within its size budget
 # - if erfahrungen.txt was uploaded
 # - if a Makefile was uploaded
 # - if a feedback-tutor.txt file was created
@@ -13,7 +15,15 @@ from subprocess import call, Popen, PIPE
 import os
 import sys
 import re
+import getopt
+import json
+from multiprocessing.pool import ThreadPool
 from correction_script import Correction
+import feedback
+from dir_snapshot import get_dir_snapshot, snapshot_tree
+from svn_tools import svn_info, get_fingerprint
+from clean_check import scan_sheet, format_problems
+import tracing
 
 
 # Color schemes
@@ -28,84 +38,315 @@ UNDERLINE = '\033[4m'
 
 # Absolute path to the working directory
 PATH = "/home/natalie/tutorat/abgaben/"
+# Results of the last run of each student
+STATE_PATH = "/home/natalie/tutorat/final_check_state.json"
 c = Correction()
 
 def get_total_points(path):
-    if os.path.exists(path + "feedback-tutor.txt"):
-        with open(path + "feedback-tutor.txt") as file:
-            lines = file.readlines()
-            for line in lines:
-                # Check whether the sum of the points was computed correctly
-                points_match = re.match(r"^([\d\.]+)/20", line, re.MULTILINE)
-                if points_match:
-                    return float(points_match.group(1))
+    parsed_feedback = feedback.parse_feedback(path + "feedback-tutor.txt")
+    if parsed_feedback and parsed_feedback.declared_total is not None:
+        return parsed_feedback.declared_total
     return -1
 
 
-def final_check_student(student, sheet_num):
+def get_student_report(student, sheet_num):
+    """Runs all checks for a student without printing anything.
+    Returns the list of report lines and a dictionary with the points, the
+    number of issues and the status of the student.
+
+    Arguments:
+    student - A string. Name of the student directory.
+    sheet_num - A string. Two digit sheet number.
+    """
     path_to_sheet = PATH + student + "/blatt-" + sheet_num + "/"
+    lines = []
+    summary = {"student": student, "points": None, "issues": 0, "status": "ok"}
 
-    print(HEADER + "\n" + "*"*80 + ENDC)
-    print(OKBLUE + BOLD + "Checking student %s..." % student + ENDC)
+    lines.append(HEADER + "\n" + "*"*80 + ENDC)
+    lines.append(OKBLUE + BOLD + "Checking student %s..." % student + ENDC)
 
-    if os.path.isdir(path_to_sheet):   
+    if get_dir_snapshot(path_to_sheet) is not None:
         # Check whether the directory was cleaned properly
         files = c.is_dir_clean(path_to_sheet)
         for file in files:
-            print(WARNING + "Should the file %s be here?" % file + ENDC)
+            lines.append(WARNING + "Should the file %s be here?" % file + ENDC)
+        summary["issues"] += len(files)
+
+        # Check for binaries, core dumps, large files and the size of the sheet
+        problems, total_size = scan_sheet(path_to_sheet)
+        problem_lines = format_problems(problems, total_size, sheet_num)
+        for line in problem_lines:
+            lines.append(WARNING + "Junk: %s" % line + ENDC)
+        summary["issues"] += len(problem_lines)
 
         # Check whether erfahrungen.txt, Makefile and feedback-tutor.txt exist
         files = c.is_file_in_dir(path_to_sheet, ["erfahrungen.txt", "Makefile", "feedback-tutor.txt"])
         for file in files:
-            print(WARNING + "Student %s doesn't have a %s in his repository." % (student, file) + ENDC)
+            lines.append(WARNING + "Student %s doesn't have a %s in his repository." % (student, file) + ENDC)
+        summary["issues"] += len(files)
 
         # Check whether files in the directory have been changed since last update
         changed_files = c.run_svn_diff(path_to_sheet)
         if changed_files:
-            print(WARNING + "There have been some changes:" + ENDC)
+            lines.append(WARNING + "There have been some changes:" + ENDC)
             for i in range(len(changed_files)):
-                print(BOLD + "    In %s:" % changed_files[i][0] + ENDC)
+                lines.append(BOLD + "    In %s:" % changed_files[i][0] + ENDC)
                 for change in changed_files[i][1]:
-                    print("    %s" % change)
-                    
+                    lines.append("    %s" % change)
+        summary["issues"] += len(changed_files)
+        svn_error = c.get_svn_snapshot(PATH).get_error(student)
+        if svn_error:
+            lines.append(FAIL + "svn failed, the changes are unknown: %s" % svn_error + ENDC)
+            summary["issues"] += 1
+
         # Check whether points were given correctly in the feedback-tutor.txt file
         errors = c.check_assigned_points(path_to_sheet)
         for err in errors:
-            print(FAIL + "Seems like you haven't assigned the points correctly: %s" % err + ENDC)
+            lines.append(FAIL + "Seems like you haven't assigned the points correctly: %s" % err + ENDC)
+        summary["issues"] += len(errors)
+        if errors:
+            summary["status"] = "points"
+        elif summary["issues"]:
+            summary["status"] = "warnings"
 
         # Print out total points
         points = get_total_points(path_to_sheet)
-        print(OKGREEN + "%s got %.1fP" % (student, points) + ENDC)
+        lines.append(OKGREEN + "%s got %.1fP" % (student, points) + ENDC)
+        summary["points"] = points
 
     else:
-        print(FAIL + "Student %s doesn't have a directory blatt-%s in his repository." % (student, sheet_num) + ENDC)
+        lines.append(FAIL + "Student %s doesn't have a directory blatt-%s in his repository." % (student, sheet_num) + ENDC)
+        summary["issues"] += 1
+        summary["status"] = "missing"
+
+    return lines, summary
+
+
+def final_check_student(student, sheet_num):
+    lines, summary = get_student_report(student, sheet_num)
+    for line in lines:
+        print(line)
+    return summary
+
+
+def print_summary_table(summaries):
+    status_colors = {"ok": OKGREEN, "warnings": WARNING, "points": FAIL, "missing": FAIL}
+    print(HEADER + "\n" + "*"*80 + ENDC)
+    print(OKBLUE + BOLD + "Summary" + ENDC)
+    print(BOLD + "    %-20s %8s %8s  %s" % ("Student", "Points", "Issues", "Status") + ENDC)
+    for summary in summaries:
+        points = "-" if summary["points"] is None else "%.1f" % summary["points"]
+        print(status_colors[summary["status"]] + "    %-20s %8s %8d  %s" % (summary["student"], points,
+              summary["issues"], summary["status"]) + ENDC)
 
 
-def final_check_all_students(directories, sheet_num):
+def print_intro():
     print(OKBLUE + BOLD + "\n" + "#"*80 + ENDC)
     print(OKBLUE + BOLD + "#"*80 + ENDC)
     print(OKBLUE + """    Before we start: I promise you, nothing bad will happen.\n
     All I'm doing is check and print.\n
-    I will not make any changes to any files nor will I create any new files.\n
-    Don't worry.""" + ENDC)
+    I will not make any changes to your files. I only remember the results in\n
+    %s to skip unchanged students next time.\n
+    Don't worry.""" % STATE_PATH + ENDC)
     print(OKBLUE + BOLD + "#"*80 + ENDC)
     print(OKBLUE + BOLD + "#"*80 + ENDC)
 
     print(OKBLUE + BOLD + "Path to be checked: %s" % PATH)
 
-    for dirc in directories:
-        if "." not in dirc:
-            final_check_student(dirc, sheet_num)
+
+def load_state():
+    if os.path.exists(STATE_PATH):
+        with open(STATE_PATH) as file:
+            try:
+                return json.load(file)
+            except ValueError:
+                print(WARNING + "Ignoring corrupt state file %s" % STATE_PATH + ENDC)
+    return {}
+
+
+def save_state(state):
+    with open(STATE_PATH, "w") as file:
+        json.dump(state, file, sort_keys=True)
+
+
+def get_fingerprints(students, sheet_num):
+    """Returns a dictionary that maps each student to a fingerprint of his
+    sheet directory, the revision and his whole working copy. The report
+    contains the svn diff of the whole working copy, so edits to nested
+    files and to other sheets must change the fingerprint too.
+
+    Arguments:
+    students - A list of strings. Names of the student directories.
+    sheet_num - A string. Two digit sheet number.
+    """
+    snapshots = snapshot_tree(PATH, sheet_num, refresh=True)
+    info = svn_info([PATH + s + "/" for s in students])
+    fingerprints = {}
+    for student in students:
+        snapshot = snapshots.get(student)
+        files = None
+        if snapshot is not None:
+            files = [[e.name, e.size, e.mtime] for e in sorted(snapshot.entries.values(), key=lambda e: e.name)]
+        fingerprints[student] = {"files": files,
+                                 "revision": info.get(PATH + student + "/", {}).get("revision"),
+                                 "working_copy": list(get_fingerprint(PATH + student))}
+    return fingerprints
+
+
+def get_changed_students(students, sheet_num, state, full=False):
+    """Returns the students that need to be checked again and the
+    fingerprints of all students.
+
+    Arguments:
+    students - A list of strings. Names of the student directories.
+    sheet_num - A string. Two digit sheet number.
+    state - A dictionary. Results of the last run by sheet and student.
+    full - A boolean. Checks all students if true.
+    """
+    with tracing.phase("fingerprints"):
+        fingerprints = get_fingerprints(students, sheet_num)
+    sheet_state = state.get(sheet_num, {})
+    changed = [s for s in students
+               if full or s not in sheet_state or sheet_state[s]["fingerprint"] != fingerprints[s]]
+    # Load svn status and diff of all changed students with a single svn call
+    with tracing.phase("svn_snapshot"):
+        c.get_svn_snapshot(PATH).preload(changed)
+    return changed, fingerprints
+
+
+def get_stored_report(student, sheet_num, state, changed, fingerprints):
+    """Returns the report of <student> from the state if he didn't change and
+    checks him again otherwise.
+
+    Arguments:
+    student - A string. Name of the student directory.
+    sheet_num - A string. Two digit sheet number.
+    state - A dictionary. Results of the last run by sheet and student.
+    changed - A list of strings. Students that need to be checked again.
+    fingerprints - A dictionary. Current fingerprint of each student.
+    """
+    sheet_state = state.setdefault(sheet_num, {})
+    if student not in changed:
+        return sheet_state[student]["lines"], sheet_state[student]["summary"]
+    with tracing.phase("check", student):
+        lines, summary = get_student_report(student, sheet_num)
+    if c.get_svn_snapshot(PATH).get_error(student):
+        # Check him again next time instead of keeping an incomplete report
+        sheet_state.pop(student, None)
+    else:
+        sheet_state[student] = {"fingerprint": fingerprints[student], "lines": lines, "summary": summary}
+    return lines, summary
+
+
+def final_check_all_students(directories, sheet_num, summary_only=False, full=False):
+    print_intro()
+
+    students = sorted([dirc for dirc in directories if "." not in dirc])
+    state = load_state()
+    changed, fingerprints = get_changed_students(students, sheet_num, state, full)
+
+    summaries = []
+    for student in students:
+        lines, summary = get_stored_report(student, sheet_num, state, changed, fingerprints)
+        if not summary_only:
+            for line in lines:
+                print(line)
+        summaries.append(summary)
+
+    save_state(state)
+    if summary_only:
+        print_summary_table(summaries)
+    print_replay_note(students, changed)
+
+
+def final_check_all_students_concurrently(directories, sheet_num, jobs, summary_only=False, full=False):
+    """Checks all students using a pool of <jobs> workers. The reports are
+    printed in sorted order once all checks are done.
+
+    Arguments:
+    directories - A list of strings. Names of the student directories.
+    sheet_num - A string. Two digit sheet number.
+    jobs - An integer. Number of students checked at the same time.
+    summary_only - A boolean. Prints only the summary table if true.
+    full - A boolean. Checks all students again if true.
+    """
+    print_intro()
+
+    students = sorted([dirc for dirc in directories if "." not in dirc])
+    state = load_state()
+    changed, fingerprints = get_changed_students(students, sheet_num, state, full)
+    state.setdefault(sheet_num, {})
+
+    pool = ThreadPool(jobs)
+    try:
+        reports = pool.map(lambda student: get_stored_report(student, sheet_num, state, changed,
+                                                             fingerprints), students)
+    finally:
+        pool.close()
+        pool.join()
+
+    save_state(state)
+    if not summary_only:
+        for lines, summary in reports:
+            for line in lines:
+                print(line)
+    print_summary_table([summary for lines, summary in reports])
+    print_replay_note(students, changed)
+
+
+def print_replay_note(students, changed):
+    if len(changed) < len(students):
+        print(OKBLUE + "Replayed the results of %d unchanged students, use --full to check everyone."
+              % (len(students) - len(changed)) + ENDC)
+
+
+def print_usage_and_exit():
+    print(WARNING + "Usage: python ./final_check.py <sheet number> [-j <number of workers>] [-s] [--full] [--trace <file>]" + ENDC)
+    sys.exit(2)
 
 
 def main():
+    options = "j:sfh"
+    long_options = ["jobs=", "summary", "full", "trace=", "help"]
+    try:
+        opts, args = getopt.gnu_getopt(sys.argv, options, long_options)
+    except getopt.GetoptError:
+        print("There has been an error while parsing the command line arguments.")
+        print_usage_and_exit()
+
+    jobs = 1
+    summary_only = False
+    full = False
+    trace_path = None
+    for opt, opt_args in opts:
+        if opt == '-j' or opt == '--jobs':
+            if not opt_args.isdigit() or int(opt_args) < 1:
+                print_usage_and_exit()
+            jobs = int(opt_args)
+        elif opt == '-s' or opt == '--summary': summary_only = True
+        elif opt == '-f' or opt == '--full': full = True
+        elif opt == '--trace': trace_path = opt_args
+        elif opt == '-h' or opt == '--help':
+            string = ("Usage: python ./final_check.py <sheet number> [arguments]\n\n"
+                      "Arguments:\n"
+                      "-j, --jobs <n>\t\t" + "Check <n> students in parallel and print a summary.\n"
+                      "-s, --summary\t\t" + "Only print a summary table of all students.\n"
+                      "-f, --full\t\t" + "Check all students, even those that didn't change since the last run.\n"
+                      "--trace <file>\t\t" + "Append the duration of each phase and svn call to <file> (JSONL).\n"
+                      "-h, --help\t\t" + "Show help options.\n")
+            print(BOLD + string + ENDC)
+            sys.exit(2)
+        else:
+            print_usage_and_exit()
+
     # Exit if a wrong number of command line arguments is given
-    arguments = sys.argv
-    if len(arguments) != 2:
-        print(WARNING + "Usage: python ./final_check.py <sheet number>" + ENDC)
-        exit()
+    if len(args) != 2:
+        print_usage_and_exit()
 
-    sheet_num = arguments[1].zfill(2)
+    if trace_path:
+        tracing.enable(trace_path, "final_check")
+
+    sheet_num = args[1].zfill(2)
     directories = os.listdir(PATH)
     directories.sort()
 
@@ -114,7 +355,10 @@ def main():
         print(WARNING + "Strange number of directories. Please check:" + ENDC)
         print(directories)
 
-    final_check_all_students(directories, sheet_num)
+    if jobs > 1:
+        final_check_all_students_concurrently(directories, sheet_num, jobs, summary_only, full)
+    else:
+        final_check_all_students(directories, sheet_num, summary_only, full)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,241 @@
+# This script collects the points of all students on all sheets from the
+# feedback-tutor.txt files and prints:
+# - the points of each student on each sheet and the projected final result
+# - the average points per exercise
+# - a histogram of the points per sheet
+# Optionally the points matrix is exported to CSV or JSON.
+
+from multiprocessing.pool import ThreadPool
+import os
+import sys
+import re
+import csv
+import json
+import getopt
+import warnings
+import feedback
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Color schemes
+HEADER = '\033[95m'
+OKBLUE = '\033[94m'
+OKGREEN = '\033[92m'
+WARNING = '\033[93m'
+FAIL = '\033[91m'
+ENDC = '\033[0m'
+BOLD = '\033[1m'
+UNDERLINE = '\033[4m'
+
+# Absolute path to the working directory
+PATH = "/home/natalie/tutorat/abgaben/"
+# Number of sheets in the semester and fraction of all points needed to pass
+NUM_SHEETS = 12
+PASS_THRESHOLD = 0.5
+
+
+def find_sheets(students):
+    """Returns the sorted list of sheet numbers of all blatt-xx directories.
+
+    Arguments:
+    students - A list of strings. Names of the student directories.
+    """
+    sheets = set()
+    for student in students:
+        for name in os.listdir(PATH + student):
+            sheet_match = re.match(r"^blatt-(\d\d)$", name)
+            if sheet_match:
+                sheets.add(sheet_match.group(1))
+    return sorted(sheets)
+
+
+def parse_all_feedback(students, sheets, jobs):
+    """Parses the feedback files of all students on all sheets in parallel.
+    Returns a dictionary that maps (student, sheet) to a Feedback object or
+    None if there is no feedback file.
+
+    Arguments:
+    students - A list of strings. Names of the student directories.
+    sheets - A list of strings. Two digit sheet numbers.
+    jobs - An integer. Number of files parsed at the same time.
+    """
+    keys = [(student, sheet) for student in students for sheet in sheets]
+    paths = [PATH + student + "/blatt-" + sheet + "/feedback-tutor.txt" for student, sheet in keys]
+    pool = ThreadPool(jobs)
+    try:
+        results = pool.map(feedback.parse_feedback, paths)
+    finally:
+        pool.close()
+        pool.join()
+    return dict(zip(keys, results))
+
+
+def build_matrices(students, sheets, parsed):
+    """Builds the points matrix of shape students x sheets x exercises, the
+    maximum points of shape sheets x exercises and the total points of shape
+    students x sheets. Missing values are NaN.
+
+    Arguments:
+    students - A list of strings. Names of the student directories.
+    sheets - A list of strings. Two digit sheet numbers.
+    parsed - A dictionary. Maps (student, sheet) to a Feedback object or None.
+    """
+    num_exercises = max([len(f.exercises) for f in parsed.values() if f] + [0])
+    points = np.full((len(students), len(sheets), num_exercises), np.nan)
+    max_points = np.full((len(sheets), num_exercises), np.nan)
+    totals = np.full((len(students), len(sheets)), np.nan)
+    for i, student in enumerate(students):
+        for j, sheet in enumerate(sheets):
+            parsed_feedback = parsed[(student, sheet)]
+            if not parsed_feedback:
+                continue
+            if parsed_feedback.exercises:
+                exercises = np.array([e[:2] for e in parsed_feedback.exercises])
+                points[i, j, :len(exercises)] = exercises[:, 0]
+                max_points[j, :len(exercises)] = np.fmax(max_points[j, :len(exercises)], exercises[:, 1])
+            if parsed_feedback.declared_total is not None:
+                totals[i, j] = parsed_feedback.declared_total
+    return points, max_points, totals
+
+
+def project_results(totals, num_sheets, threshold):
+    """Projects the final points of every student by assuming he keeps his
+    average on the remaining sheets. A sheet counts as graded once any
+    student has points on it; students without points on a graded sheet get
+    0 for it.
+    Returns the projected points and a boolean array of who would pass.
+
+    Arguments:
+    totals - A NumPy array of shape students x sheets. NaN if not graded.
+    num_sheets - An integer. Number of sheets in the semester.
+    threshold - A float. Fraction of all points needed to pass.
+    """
+    num_graded = (~np.isnan(totals)).any(axis=0).sum()
+    points_so_far = np.nansum(totals, axis=1)
+    average = points_so_far / num_graded if num_graded else np.zeros(len(totals))
+    remaining = max(num_sheets - num_graded, 0)
+    projected = points_so_far + average * remaining
+    return projected, projected >= threshold * feedback.TOTAL_POINTS * num_sheets
+
+
+def print_gradebook(students, sheets, points, max_points, totals, num_sheets, threshold):
+    projected, passing = project_results(totals, num_sheets, threshold)
+
+    print(HEADER + "\n" + "*"*80 + ENDC)
+    print(OKBLUE + BOLD + "Points per sheet" + ENDC)
+    print(BOLD + "    %-20s" % "Student" + "".join(["%7s" % s for s in sheets])
+          + "%9s%11s" % ("Sum", "Projected") + ENDC)
+    for i, student in enumerate(students):
+        cells = "".join(["%7s" % ("-" if np.isnan(t) else "%.1f" % t) for t in totals[i]])
+        color = OKGREEN if passing[i] else FAIL
+        print(color + "    %-20s" % student + cells + "%9.1f%11.1f" % (np.nansum(totals[i]), projected[i]) + ENDC)
+    print(OKBLUE + "    %d of %d students would pass with a threshold of %d%%"
+          % (passing.sum(), len(students), threshold * 100) + ENDC)
+
+    print(HEADER + "\n" + "*"*80 + ENDC)
+    print(OKBLUE + BOLD + "Average points per exercise" + ENDC)
+    # Exercises without any points have a NaN mean, which is fine here
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        means = np.nanmean(points, axis=0) if points.size else points.sum(axis=0)
+    for j, sheet in enumerate(sheets):
+        cells = ["%.1f/%d" % (means[j, k], max_points[j, k])
+                 for k in range(points.shape[2]) if not np.isnan(max_points[j, k])]
+        print("    blatt-%s: %s" % (sheet, "  ".join(cells)))
+
+    print(HEADER + "\n" + "*"*80 + ENDC)
+    print(OKBLUE + BOLD + "Histogram of the total points per sheet" + ENDC)
+    bins = np.arange(0, feedback.TOTAL_POINTS + 2, 2)
+    for j, sheet in enumerate(sheets):
+        graded = totals[:, j][~np.isnan(totals[:, j])]
+        counts = np.histogram(graded, bins=bins)[0]
+        print(BOLD + "    blatt-%s (mean %.1f)" % (sheet, graded.mean() if graded.size else 0) + ENDC)
+        for k, count in enumerate(counts):
+            print("      %2d-%2d %s" % (bins[k], bins[k + 1], "#" * count))
+
+
+def export_csv(path, students, sheets, points, max_points):
+    with open(path, "w") as file:
+        writer = csv.writer(file)
+        writer.writerow(["student", "sheet", "exercise", "points", "max_points"])
+        for i, student in enumerate(students):
+            for j, sheet in enumerate(sheets):
+                for k in range(points.shape[2]):
+                    if not np.isnan(points[i, j, k]):
+                        writer.writerow([student, sheet, k + 1, points[i, j, k], max_points[j, k]])
+
+
+def export_json(path, students, sheets, points, max_points, totals):
+    def to_list(array):
+        return np.where(np.isnan(array), None, array).tolist()
+    with open(path, "w") as file:
+        json.dump({"students": students, "sheets": sheets, "points": to_list(points),
+                   "max_points": to_list(max_points), "totals": to_list(totals)}, file)
+
+
+def print_usage_and_exit():
+    print(WARNING + "Usage: python ./gradebook.py [arguments]" + ENDC)
+    sys.exit(2)
+
+
+def main():
+    options = "j:n:t:h"
+    long_options = ["jobs=", "sheets=", "threshold=", "csv=", "json=", "help"]
+    try:
+        opts, args = getopt.gnu_getopt(sys.argv, options, long_options)
+    except getopt.GetoptError:
+        print("There has been an error while parsing the command line arguments.")
+        print_usage_and_exit()
+
+    jobs = 8
+    num_sheets = NUM_SHEETS
+    threshold = PASS_THRESHOLD
+    csv_path = None
+    json_path = None
+    try:
+        for opt, opt_args in opts:
+            if opt == '-j' or opt == '--jobs': jobs = max(1, int(opt_args))
+            elif opt == '-n' or opt == '--sheets': num_sheets = int(opt_args)
+            elif opt == '-t' or opt == '--threshold': threshold = float(opt_args)
+            elif opt == '--csv': csv_path = opt_args
+            elif opt == '--json': json_path = opt_args
+            elif opt == '-h' or opt == '--help':
+                string = ("Usage: python ./gradebook.py [arguments]\n\n"
+                          "Arguments:\n"
+                          "-j, --jobs <n>\t\t" + "Parse <n> feedback files in parallel.\n"
+                          "-n, --sheets <n>\t" + "Number of sheets in the semester (default %d).\n" % NUM_SHEETS +
+                          "-t, --threshold <f>\t" + "Fraction of all points needed to pass (default %.2f).\n" % PASS_THRESHOLD +
+                          "--csv <file>\t\t" + "Export the points of all exercises to a CSV file.\n"
+                          "--json <file>\t\t" + "Export the points matrix to a JSON file.\n"
+                          "-h, --help\t\t" + "Show help options.\n")
+                print(BOLD + string + ENDC)
+                sys.exit(2)
+    except ValueError:
+        print_usage_and_exit()
+
+    if len(args) != 1:
+        print_usage_and_exit()
+
+    if np is None:
+        print(FAIL + "The gradebook needs NumPy. Please install it first." + ENDC)
+        sys.exit(1)
+
+    students = sorted([d for d in os.listdir(PATH) if "." not in d and os.path.isdir(PATH + d)])
+    sheets = find_sheets(students)
+    parsed = parse_all_feedback(students, sheets, jobs)
+    points, max_points, totals = build_matrices(students, sheets, parsed)
+
+    print_gradebook(students, sheets, points, max_points, totals, num_sheets, threshold)
+    if csv_path:
+        export_csv(csv_path, students, sheets, points, max_points)
+        print(OKGREEN + "Exported the points to %s" % csv_path + ENDC)
+    if json_path:
+        export_json(json_path, students, sheets, points, max_points, totals)
+        print(OKGREEN + "Exported the points to %s" % json_path + ENDC)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,469 @@
+from subprocess import PIPE, STDOUT
+from multiprocessing.pool import ThreadPool
+import os
+import re
+import sys
+import shutil
+import tempfile
+import threading
+import hashlib
+import json
+import time
+import signal
+import collections
+from tracing import Popen
+
+
+# Targets that are run for every student
+MAKE_TARGETS = ["test", "checkstyle", "compile", "clean"]
+
+# Absolute path to the cache of make results
+CACHE_PATH = "/home/natalie/tutorat/make_cache/"
+# Limits of the cache, the least recently used results are evicted first
+CACHE_MAX_SIZE = 50 * 1024 * 1024
+CACHE_MAX_ENTRIES = 2000
+
+# Limits for sandboxed make runs. timeout is the wall clock time of the whole
+# run in seconds, cpu the cpu seconds and memory the address space in bytes of
+# every single process. processes limits the number of processes of the user
+# and is off by default since it also counts the processes of the desktop.
+DEFAULT_LIMITS = {"timeout": 120, "cpu": 60, "memory": 2 * 1024 * 1024 * 1024, "processes": None}
+# Exit status reported if the wall clock timeout was hit
+TIMEOUT_STATUS = 124
+# Number of output lines kept of a single make run
+MAX_OUTPUT_LINES = 2000
+
+# Signals that kill processes which hit a limit
+SIGNAL_REASONS = {signal.SIGXCPU: "cpu time limit exceeded",
+                  signal.SIGKILL: "killed"}
+# Descriptions of these signals in the error lines of make
+SIGNAL_DESCRIPTIONS = {"CPU time limit exceeded": signal.SIGXCPU,
+                       "Killed": signal.SIGKILL}
+# Error line of make for a failed recipe: "Error <status>" if a shell ran the
+# command, the description of the signal if it was killed directly
+MAKE_ERROR_PATTERN = re.compile(r"^make(?:\[\d+\])?: \*\*\* \[[^\]]*\] (?:Error (\d+)|(.+?))(?: \(core dumped\))?$",
+                                re.MULTILINE)
+# Failed allocations don't kill the process, so the memory limit can only be
+# recognized by the error messages of the common runtimes
+MEMORY_MESSAGES = ["std::bad_alloc", "Cannot allocate memory", "OutOfMemoryError", "MemoryError"]
+# Error message of fork if the process limit was hit
+PROCESS_MESSAGE = "Resource temporarily unavailable"
+
+# Starts make in its own process group with the resource limits. This runs in
+# a new interpreter because preexec_fn isn't safe while other threads run.
+SANDBOX_SCRIPT = """
+import os, sys
+os.setsid()
+try:
+    import resource
+except ImportError:
+    resource = None
+cpu, memory, processes = [int(limit) for limit in sys.argv[1:4]]
+if resource and cpu:
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 5))
+if resource and memory:
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+if resource and processes:
+    resource.setrlimit(resource.RLIMIT_NPROC, (processes, processes))
+os.execvp(sys.argv[4], sys.argv[4:])
+"""
+
+
+def get_sandbox_command(command, limits):
+    """Returns the command that runs <command> in its own process group
+    with the resource limits.
+
+    Arguments:
+    command - A list of strings. Program and arguments.
+    limits - A dictionary like DEFAULT_LIMITS.
+    """
+    return [sys.executable, "-c", SANDBOX_SCRIPT] + \
+           [str(limits.get(name) or 0) for name in ["cpu", "memory", "processes"]] + command
+
+
+def kill_process_group(pid):
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+class RunningBuilds:
+    """Keeps track of the make runs in the background so that they can be
+    killed when the tutor quits. Every run is in its own process group.
+    """
+
+    def __init__(self):
+        self.pids = set()
+        self.lock = threading.Lock()
+        self.stopped = False
+
+
+    def add(self, pid):
+        with self.lock:
+            if not self.stopped:
+                self.pids.add(pid)
+                return
+        kill_process_group(pid)
+
+
+    def remove(self, pid):
+        with self.lock:
+            self.pids.discard(pid)
+
+
+    def stop(self):
+        """Kills all running builds and every build that starts later."""
+        with self.lock:
+            self.stopped = True
+            pids = list(self.pids)
+        for pid in pids:
+            # The sandbox might not have called setsid yet
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+            kill_process_group(pid)
+
+
+def get_killing_signal(output):
+    """Returns the signal that killed a command of make according to the
+    error lines of make, or None.
+
+    Arguments:
+    output - A string. Output of make.
+    """
+    for status, description in MAKE_ERROR_PATTERN.findall(output):
+        if status and int(status) > 128:
+            return int(status) - 128
+        if description in SIGNAL_DESCRIPTIONS:
+            return SIGNAL_DESCRIPTIONS[description]
+    return None
+
+
+def get_kill_reason(output, returncode, timed_out, limits):
+    """Returns a message explaining why make was stopped or None.
+
+    Arguments:
+    output - A string. Output of make.
+    returncode - An integer. Exit status of make.
+    timed_out - A boolean. Whether the wall clock timeout was hit.
+    limits - A dictionary like DEFAULT_LIMITS.
+    """
+    if timed_out:
+        return "wall clock timeout of %ds exceeded, killed all processes" % limits["timeout"]
+    if returncode == 0:
+        return None
+    if returncode < 0:
+        return "make was killed by signal %d" % -returncode
+    signum = get_killing_signal(output)
+    if signum:
+        return SIGNAL_REASONS.get(signum, "killed by signal %d" % signum)
+    if limits.get("memory") and any(message in output for message in MEMORY_MESSAGES):
+        return "memory limit exceeded"
+    if limits.get("processes") and PROCESS_MESSAGE in output:
+        return "process limit exceeded"
+    return None
+
+
+def run_make_captured(path, echo=False, limits=None, builds=None):
+    """Runs make test, checkstyle, compile and clean and captures the output.
+    Returns a tuple of the combined stdout and stderr and the exit status.
+    With limits, make runs in its own process group which is killed once a
+    limit is hit, and only the last MAX_OUTPUT_LINES lines are kept.
+
+    Arguments:
+    path - A string. Path to the blatt-xx directory of the student.
+    echo - A boolean. Prints the output while make is running if true.
+           make then reads from the terminal like without capturing,
+           otherwise it reads from /dev/null.
+    limits - A dictionary like DEFAULT_LIMITS or None for no limits.
+    builds - A RunningBuilds or None. make then always runs in its own
+             process group and is registered there while it runs.
+    """
+    # Builds in the background must not take the input of the tutor
+    stdin = None if echo else open(os.devnull)
+    if not limits:
+        command = ["make"] + MAKE_TARGETS + ["-C", path]
+        if builds:
+            command = get_sandbox_command(command, {})
+        p = Popen(command, stdin=stdin, stdout=PIPE, stderr=STDOUT, universal_newlines=True)
+        if stdin:
+            stdin.close()
+        if builds:
+            builds.add(p.pid)
+        lines = []
+        try:
+            for line in iter(p.stdout.readline, ""):
+                if echo:
+                    sys.stdout.write(line)
+                    sys.stdout.flush()
+                lines.append(line)
+            p.stdout.close()
+            p.wait()
+        finally:
+            if builds:
+                builds.remove(p.pid)
+        return "".join(lines), p.returncode
+
+    p = Popen(get_sandbox_command(["make"] + MAKE_TARGETS + ["-C", path], limits), stdin=stdin,
+              stdout=PIPE, stderr=STDOUT, universal_newlines=True)
+    if stdin:
+        stdin.close()
+    if builds:
+        builds.add(p.pid)
+    timed_out = []
+    def on_timeout():
+        timed_out.append(True)
+        kill_process_group(p.pid)
+    timer = threading.Timer(limits["timeout"], on_timeout)
+    timer.daemon = True
+    timer.start()
+
+    lines = collections.deque(maxlen=MAX_OUTPUT_LINES)
+    dropped = 0
+    try:
+        for line in iter(p.stdout.readline, ""):
+            if echo:
+                sys.stdout.write(line)
+                sys.stdout.flush()
+            if len(lines) == MAX_OUTPUT_LINES:
+                dropped += 1
+            lines.append(line)
+        p.stdout.close()
+        p.wait()
+    finally:
+        timer.cancel()
+        # Don't leave processes of the student behind
+        kill_process_group(p.pid)
+        if builds:
+            builds.remove(p.pid)
+
+    output = "".join(lines)
+    if dropped:
+        output = "[... %d lines dropped]\n" % dropped + output
+    returncode = TIMEOUT_STATUS if timed_out else p.returncode
+    reason = get_kill_reason(output, returncode, timed_out, limits)
+    if reason:
+        output += "*** make stopped: %s\n" % reason
+    return output, returncode
+
+
+def get_source_hash(path, limits=None):
+    """Returns a hash over the make targets, <path>, the limits and the names
+    and contents of all files in <path> except feedback-tutor.txt.
+    The timeout isn't part of the hash since timed out runs aren't cached.
+
+    Arguments:
+    path - A string. Path to the blatt-xx directory of the student.
+    limits - A dictionary like DEFAULT_LIMITS or None for no limits.
+    """
+    limits = dict((name, value) for name, value in (limits or {}).items() if name != "timeout")
+    sha = hashlib.sha1()
+    sha.update((" ".join(MAKE_TARGETS) + "\0" + path + "\0").encode("utf-8"))
+    sha.update((json.dumps(limits, sort_keys=True) + "\0").encode("utf-8"))
+    for root, dirs, files in os.walk(path):
+        if ".svn" in dirs:
+            dirs.remove(".svn")
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            relative_path = os.path.relpath(file_path, path)
+            if relative_path == "feedback-tutor.txt":
+                continue
+            sha.update((relative_path + "\0").encode("utf-8"))
+            try:
+                with open(file_path, "rb") as file:
+                    for block in iter(lambda: file.read(65536), b""):
+                        sha.update(block)
+            except (IOError, OSError):
+                pass
+            sha.update(b"\0")
+    return sha.hexdigest()
+
+
+class MakeCache:
+    """Persistent cache of make results keyed by the hash of the sources.
+    Each result is a small json file; its mtime is used for LRU eviction.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_size=CACHE_MAX_SIZE, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_size = max_size
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+
+
+    def lookup(self, key):
+        """Returns the cached output and exit status for <key> or None.
+
+        Arguments:
+        key - A string. Hash returned by get_source_hash.
+        """
+        path_to_entry = self.path + key + ".json"
+        try:
+            with open(path_to_entry) as file:
+                entry = json.load(file)
+            os.utime(path_to_entry, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return entry["output"], entry["returncode"]
+
+
+    def store(self, key, output, returncode):
+        """Stores a make result and evicts old results if the cache is full.
+
+        Arguments:
+        key - A string. Hash returned by get_source_hash.
+        output - A string. Output of make.
+        returncode - An integer. Exit status of make.
+        """
+        with self.lock:
+            try:
+                if not os.path.isdir(self.path):
+                    os.makedirs(self.path)
+                with open(self.path + key + ".json", "w") as file:
+                    json.dump({"output": output, "returncode": returncode,
+                               "created": time.time()}, file)
+            except (IOError, OSError):
+                return
+            self.evict()
+
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.path):
+            try:
+                stat = os.stat(self.path + name)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+        total_size = sum(entry[1] for entry in entries)
+        while entries and (total_size > self.max_size or len(entries) > self.max_entries):
+            mtime, size, name = entries.pop(0)
+            total_size -= size
+            try:
+                os.remove(self.path + name)
+            except OSError:
+                pass
+
+
+def run_make_cached(path, cache=None, in_copy=False, echo=False, limits=None, builds=None):
+    """Runs make for <path> unless the cache has a result for the current
+    sources.
+    Returns a tuple of the output, the exit status and whether the result
+    came from the cache.
+
+    Arguments:
+    path - A string. Path to the blatt-xx directory of the student.
+    cache - A MakeCache or None.
+    in_copy - A boolean. Builds in a temporary copy of <path> if true.
+    echo - A boolean. Prints the output while make is running if true.
+    limits - A dictionary like DEFAULT_LIMITS or None for no limits.
+    builds - A RunningBuilds or None, see run_make_captured.
+    """
+    key = get_source_hash(path, limits) if cache else None
+    if cache:
+        result = cache.lookup(key)
+        if result:
+            return result[0], result[1], True
+    if in_copy:
+        output, returncode = run_make_in_copy(path, limits, builds)
+    else:
+        output, returncode = run_make_captured(path, echo, limits, builds)
+    # Timeouts depend on the load of the machine, so don't keep them.
+    # Neither do builds that were killed because the tutor quit.
+    if builds and builds.stopped:
+        return output, returncode, False
+    if cache and returncode != TIMEOUT_STATUS:
+        cache.store(key, output, returncode)
+    return output, returncode, False
+
+
+def run_make_in_copy(path, limits=None, builds=None):
+    """Runs make in a temporary copy of <path> so that the build doesn't touch
+    the working copy of the student while the tutor is looking at it.
+    Returns a tuple of the output and the exit status.
+
+    Arguments:
+    path - A string. Path to the blatt-xx directory of the student.
+    limits - A dictionary like DEFAULT_LIMITS or None for no limits.
+    builds - A RunningBuilds or None, see run_make_captured.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix="tutorage-make-")
+    path_to_copy = os.path.join(tmp_dir, os.path.basename(os.path.normpath(path))) + "/"
+    try:
+        shutil.copytree(path, path_to_copy, symlinks=True,
+                        ignore=shutil.ignore_patterns(".svn"))
+        output, returncode = run_make_captured(path_to_copy, limits=limits, builds=builds)
+        # Show the real path of the student in the output
+        return output.replace(path_to_copy.rstrip("/"), path.rstrip("/")), returncode
+    except (IOError, OSError, shutil.Error) as e:
+        return "Could not build a copy of %s: %s\n" % (path, e), -1
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+class MakePrefetcher:
+    """Builds the sheets of upcoming students in the background while the
+    tutor corrects the current one. Results are kept until they are
+    discarded, so navigating back to a student doesn't rebuild.
+    """
+
+    def __init__(self, lookahead=2, jobs=1, cache=None, limits=None):
+        # Number of students that are built ahead of the current one
+        self.lookahead = lookahead
+        self.cache = cache
+        self.limits = limits
+        self.pool = ThreadPool(jobs)
+        self.builds = RunningBuilds()
+        self.results = {}
+        self.lock = threading.Lock()
+
+
+    def prefetch(self, paths):
+        """Starts building all given sheets that weren't built yet.
+
+        Arguments:
+        paths - A list of strings. Paths to blatt-xx directories in the order
+                in which they should be built.
+        """
+        with self.lock:
+            for path in paths:
+                if path not in self.results:
+                    self.results[path] = self.pool.apply_async(run_make_cached, (path, self.cache, True, False, self.limits, self.builds))
+
+
+    def get_result(self, path):
+        """Returns the output, exit status and cache flag of make for <path>.
+        Waits for a running build and starts one if necessary.
+
+        Arguments:
+        path - A string. Path to the blatt-xx directory of the student.
+        """
+        self.prefetch([path])
+        return self.results[path].get()
+
+
+    def is_ready(self, path):
+        return path in self.results and self.results[path].ready()
+
+
+    def discard(self, path):
+        """Forgets the result for <path> so that the next request rebuilds.
+
+        Arguments:
+        path - A string. Path to the blatt-xx directory of the student.
+        """
+        with self.lock:
+            self.results.pop(path, None)
+
+
+    def close(self):
+        """Kills the running builds and waits until the workers removed
+        their temporary copies.
+        """
+        self.builds.stop()
+        self.pool.terminate()
+        self.pool.join()
\ No newline at end of file
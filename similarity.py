@@ -0,0 +1,333 @@
+# This script looks for copied solutions. It tokenizes the source files of
+# every blatt-xx submission, computes a MinHash signature per submission and
+# uses locality sensitive hashing (LSH) to find the pairs of submissions that
+# are likely similar, so not every pair has to be compared.
+# The signatures are cached by the hash of each file, so re-runs and
+# comparisons across several sheets only tokenize new or changed files.
+
+from multiprocessing.pool import ThreadPool
+import os
+import sys
+import re
+import json
+import time
+import getopt
+import hashlib
+import zlib
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Color schemes
+HEADER = '\033[95m'
+OKBLUE = '\033[94m'
+OKGREEN = '\033[92m'
+WARNING = '\033[93m'
+FAIL = '\033[91m'
+ENDC = '\033[0m'
+BOLD = '\033[1m'
+UNDERLINE = '\033[4m'
+
+# Absolute path to the working directory
+PATH = "/home/natalie/tutorat/abgaben/"
+# Signatures of all files seen so far by the hash of their content
+CACHE_PATH = "/home/natalie/tutorat/similarity_cache.json"
+CACHE_MAX_ENTRIES = 20000
+# Files that are compared, the Makefile and the txt files are mostly templates
+SOURCE_EXTENSIONS = [".c", ".h", ".cc", ".cpp", ".hpp", ".java", ".py"]
+# Number of tokens per shingle
+SHINGLE_SIZE = 5
+# Number of hash functions of a signature, split into bands of rows for LSH.
+# Pairs with a similarity above about (1/BANDS)^(1/ROWS) become candidates.
+NUM_HASHES = 128
+BANDS = 32
+ROWS = NUM_HASHES // BANDS
+# Minimum estimated similarity of a reported pair
+THRESHOLD = 0.5
+# Mersenne prime for the hash functions (a * x + b) % PRIME. Products stay
+# below 2^62, so they fit into 64 bit integers.
+PRIME = (1 << 31) - 1
+SEED = "1"
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z_]\w*|\d+(?:\.\d+)?|\S")
+COMMENT_PATTERN = re.compile(r"/\*.*?\*/|//[^\n]*|#[^\n]*", re.DOTALL)
+
+
+def get_coefficient(name):
+    """Returns a pseudo random number below PRIME that is the same on every
+    machine and Python version, so cached signatures stay comparable.
+    """
+    return int(hashlib.sha1((SEED + name).encode("utf-8")).hexdigest(), 16) % PRIME
+
+
+COEFFICIENTS = [(get_coefficient("a%d" % i) or 1, get_coefficient("b%d" % i)) for i in range(NUM_HASHES)]
+
+# Loaded cache, see load_cache
+signature_cache = None
+
+
+def tokenize(text):
+    """Returns the list of tokens of a source file. Comments and whitespace
+    are dropped, so reformatting a copied solution doesn't change the tokens.
+
+    Arguments:
+    text - A string. Content of the file.
+    """
+    return TOKEN_PATTERN.findall(COMMENT_PATTERN.sub(" ", text))
+
+
+def get_shingles(tokens, size=SHINGLE_SIZE):
+    """Returns the set of hashes of all sequences of <size> tokens.
+
+    Arguments:
+    tokens - A list of strings.
+    size - An integer. Number of tokens per shingle.
+    """
+    if 0 < len(tokens) < size:
+        size = len(tokens)
+    shingles = set()
+    for i in range(len(tokens) - size + 1):
+        shingle = " ".join(tokens[i:i + size]).encode("utf-8")
+        shingles.add((zlib.crc32(shingle) & 0xffffffff) % PRIME)
+    return shingles
+
+
+def compute_signature(shingles):
+    """Returns the MinHash signature of a set of shingles: for each hash
+    function the minimum over all shingles. Empty sets get PRIME everywhere.
+
+    Arguments:
+    shingles - A set of integers below PRIME.
+    """
+    if not shingles:
+        return [PRIME] * NUM_HASHES
+    if np is not None:
+        values = np.array(sorted(shingles), dtype=np.uint64)
+        a = np.array([c[0] for c in COEFFICIENTS], dtype=np.uint64)[:, None]
+        b = np.array([c[1] for c in COEFFICIENTS], dtype=np.uint64)[:, None]
+        return [int(v) for v in ((a * values + b) % PRIME).min(axis=1)]
+    return [min([(a * x + b) % PRIME for x in shingles]) for a, b in COEFFICIENTS]
+
+
+def merge_signatures(signatures):
+    """Returns the signature of the union of the shingles of all given
+    signatures, which is the element-wise minimum.
+    """
+    if not signatures:
+        return [PRIME] * NUM_HASHES
+    return [min(values) for values in zip(*signatures)]
+
+
+def estimate_similarity(signature_a, signature_b):
+    """Returns the fraction of equal entries, an estimate of the Jaccard
+    similarity of the shingles of both signatures.
+    """
+    equal = len([1 for a, b in zip(signature_a, signature_b) if a == b and a != PRIME])
+    return float(equal) / NUM_HASHES
+
+
+def load_cache():
+    global signature_cache
+    if signature_cache is None:
+        signature_cache = {}
+        if os.path.exists(CACHE_PATH):
+            with open(CACHE_PATH) as file:
+                try:
+                    cache = json.load(file)
+                except ValueError:
+                    print(WARNING + "Ignoring corrupt cache file %s" % CACHE_PATH + ENDC)
+                    cache = {}
+            # Signatures of other parameters can't be compared
+            if cache.get("parameters") == [SHINGLE_SIZE, NUM_HASHES, SEED]:
+                signature_cache = cache["signatures"]
+    return signature_cache
+
+
+def save_cache(cache):
+    """Writes the cache and drops the least recently used signatures if it
+    has more than CACHE_MAX_ENTRIES entries.
+    """
+    if len(cache) > CACHE_MAX_ENTRIES:
+        for key in sorted(cache, key=lambda k: cache[k]["used"])[:len(cache) - CACHE_MAX_ENTRIES]:
+            del cache[key]
+    try:
+        with open(CACHE_PATH, "w") as file:
+            json.dump({"parameters": [SHINGLE_SIZE, NUM_HASHES, SEED], "signatures": cache}, file)
+    except IOError:
+        print(WARNING + "Could not save the cache to %s" % CACHE_PATH + ENDC)
+
+
+def get_source_files(path):
+    """Returns the sorted paths of all source files in <path>.
+
+    Arguments:
+    path - A string. Path to the blatt-xx directory of the student.
+    """
+    paths = []
+    for root, dirs, files in os.walk(path):
+        if ".svn" in dirs:
+            dirs.remove(".svn")
+        for name in files:
+            if os.path.splitext(name)[1] in SOURCE_EXTENSIONS:
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def get_file_signature(path, cache):
+    """Returns the signature of a file and whether it was taken from the
+    cache. Files that can't be read get an empty signature.
+
+    Arguments:
+    path - A string. Path to the file.
+    cache - A dictionary. Maps the sha1 of a file to its signature.
+    """
+    try:
+        with open(path, "rb") as file:
+            content = file.read()
+    except (IOError, OSError):
+        return compute_signature(set()), False
+    key = hashlib.sha1(content).hexdigest()
+    entry = cache.get(key)
+    if entry is not None:
+        entry["used"] = time.time()
+        return entry["signature"], True
+    signature = compute_signature(get_shingles(tokenize(content.decode("utf-8", "replace"))))
+    cache[key] = {"signature": signature, "used": time.time()}
+    return signature, False
+
+
+def get_submission_signatures(students, sheets, jobs):
+    """Computes the signatures of all submissions in parallel.
+    Returns a dictionary that maps (student, sheet) to the signature of the
+    submission and the number of files that had to be tokenized.
+
+    Arguments:
+    students - A list of strings. Names of the student directories.
+    sheets - A list of strings. Two digit sheet numbers.
+    jobs - An integer. Number of files processed at the same time.
+    """
+    cache = load_cache()
+    files = {}
+    for student in students:
+        for sheet in sheets:
+            path_to_sheet = PATH + student + "/blatt-" + sheet + "/"
+            if os.path.isdir(path_to_sheet):
+                files[(student, sheet)] = get_source_files(path_to_sheet)
+
+    paths = [path for key in sorted(files) for path in files[key]]
+    pool = ThreadPool(jobs)
+    try:
+        results = dict(zip(paths, pool.map(lambda path: get_file_signature(path, cache), paths)))
+    finally:
+        pool.close()
+        pool.join()
+    save_cache(cache)
+
+    signatures = {}
+    for key in files:
+        signature = merge_signatures([results[path][0] for path in files[key]])
+        if any(value != PRIME for value in signature):
+            signatures[key] = signature
+    tokenized = len([1 for signature, cached in results.values() if not cached])
+    return signatures, tokenized
+
+
+def find_candidate_pairs(signatures):
+    """Puts each band of each signature into a bucket. Submissions that share
+    a bucket in any band are candidates.
+    Returns the set of candidate pairs of keys of <signatures>.
+
+    Arguments:
+    signatures - A dictionary. Maps (student, sheet) to a signature.
+    """
+    candidates = set()
+    for band in range(BANDS):
+        buckets = {}
+        for key, signature in signatures.items():
+            buckets.setdefault(tuple(signature[band * ROWS:(band + 1) * ROWS]), []).append(key)
+        for bucket in buckets.values():
+            for i in range(len(bucket)):
+                for j in range(i + 1, len(bucket)):
+                    # Earlier submissions of the same student aren't copies
+                    if bucket[i][0] != bucket[j][0]:
+                        candidates.add(tuple(sorted([bucket[i], bucket[j]])))
+    return candidates
+
+
+def find_similar_pairs(signatures, threshold):
+    """Returns the list of (similarity, key, key) of all candidate pairs with
+    an estimated similarity of at least <threshold>, most similar first.
+
+    Arguments:
+    signatures - A dictionary. Maps (student, sheet) to a signature.
+    threshold - A float between 0 and 1.
+    """
+    pairs = []
+    for key_a, key_b in find_candidate_pairs(signatures):
+        similarity = estimate_similarity(signatures[key_a], signatures[key_b])
+        if similarity >= threshold:
+            pairs.append((similarity, key_a, key_b))
+    pairs.sort(key=lambda pair: (-pair[0], pair[1], pair[2]))
+    return pairs
+
+
+def print_pairs(pairs, num_submissions, tokenized, threshold):
+    print(HEADER + "\n" + "*"*80 + ENDC)
+    print(OKBLUE + BOLD + "Similar submissions" + ENDC)
+    print(OKBLUE + "    %d submissions, %d files tokenized, the others were cached" % (num_submissions, tokenized) + ENDC)
+    if not pairs:
+        print(OKGREEN + "    No pairs with a similarity of at least %d%%." % (threshold * 100) + ENDC)
+        return
+    print(BOLD + "    %-30s %-30s %10s" % ("Submission", "Submission", "Similarity") + ENDC)
+    for similarity, key_a, key_b in pairs:
+        color = FAIL if similarity >= 0.8 else WARNING
+        print(color + "    %-30s %-30s %9d%%" % ("%s/blatt-%s" % key_a, "%s/blatt-%s" % key_b,
+                                                 similarity * 100) + ENDC)
+
+
+def print_usage_and_exit():
+    print(WARNING + "Usage: python ./similarity.py <sheet number> [<sheet number> ...] [-t <threshold>] [-j <number of workers>]" + ENDC)
+    sys.exit(2)
+
+
+def main():
+    options = "j:t:h"
+    long_options = ["jobs=", "threshold=", "help"]
+    try:
+        opts, args = getopt.gnu_getopt(sys.argv, options, long_options)
+    except getopt.GetoptError:
+        print("There has been an error while parsing the command line arguments.")
+        print_usage_and_exit()
+
+    jobs = 8
+    threshold = THRESHOLD
+    try:
+        for opt, opt_args in opts:
+            if opt == '-j' or opt == '--jobs': jobs = max(1, int(opt_args))
+            elif opt == '-t' or opt == '--threshold': threshold = float(opt_args)
+            elif opt == '-h' or opt == '--help':
+                string = ("Usage: python ./similarity.py <sheet number> [<sheet number> ...] [arguments]\n\n"
+                          "Compares all submissions of the given sheets with each other.\n\n"
+                          "Arguments:\n"
+                          "-t, --threshold <f>\t" + "Minimum similarity of a reported pair (default %.2f).\n" % THRESHOLD +
+                          "-j, --jobs <n>\t\t" + "Tokenize <n> files in parallel.\n"
+                          "-h, --help\t\t" + "Show help options.\n")
+                print(BOLD + string + ENDC)
+                sys.exit(2)
+    except ValueError:
+        print_usage_and_exit()
+
+    if len(args) < 2 or not all(arg.isdigit() for arg in args[1:]):
+        print_usage_and_exit()
+
+    sheets = sorted(set(arg.zfill(2) for arg in args[1:]))
+    students = sorted([d for d in os.listdir(PATH) if "." not in d and os.path.isdir(PATH + d)])
+    signatures, tokenized = get_submission_signatures(students, sheets, jobs)
+    pairs = find_similar_pairs(signatures, threshold)
+    print_pairs(pairs, len(signatures), tokenized, threshold)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
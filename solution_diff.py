@@ -0,0 +1,273 @@
+import os
+import json
+import time
+import hashlib
+import difflib
+import threading
+import multiprocessing
+from similarity import TOKEN_PATTERN, COMMENT_PATTERN
+
+
+# Diffs of all pairs of files seen so far by the hash of both files
+CACHE_PATH = "/home/natalie/tutorat/solution_diff_cache.json"
+CACHE_MAX_ENTRIES = 5000
+# Number of hunks per file in the summary and their maximum width
+SUMMARY_HUNKS = 3
+MAX_HUNK_WIDTH = 60
+
+
+def tokenize(text):
+    """Returns the list of (token, line number) of a file. Comments are
+    dropped, but the line numbers still match the original file.
+
+    Arguments:
+    text - A string. Content of the file.
+    """
+    text = COMMENT_PATTERN.sub(lambda match: "\n" * match.group(0).count("\n"), text)
+    tokens = []
+    for number, line in enumerate(text.split("\n")):
+        for token in TOKEN_PATTERN.findall(line):
+            tokens.append((token, number + 1))
+    return tokens
+
+
+def get_line_range(tokens, start, end):
+    """Returns the first and last line of tokens[start:end]. An empty range
+    is placed after the line of the previous token.
+    """
+    if start < end:
+        return [tokens[start][1], tokens[end - 1][1]]
+    line = tokens[start - 1][1] if start > 0 else 0
+    return [line, line]
+
+
+def diff_texts(solution_text, student_text):
+    """Compares the tokens of two files.
+    Returns a dictionary with the similarity ratio, the number of added and
+    removed tokens and the list of hunks. Each hunk is a list of the line
+    range and tokens in the solution followed by those in the student file.
+
+    Arguments:
+    solution_text - A string. Content of the file of the solution.
+    student_text - A string. Content of the file of the student.
+    """
+    solution = tokenize(solution_text)
+    student = tokenize(student_text)
+    matcher = difflib.SequenceMatcher(None, [t[0] for t in solution], [t[0] for t in student], autojunk=False)
+    added = 0
+    removed = 0
+    hunks = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        removed += i2 - i1
+        added += j2 - j1
+        hunks.append([get_line_range(solution, i1, i2), " ".join([t[0] for t in solution[i1:i2]]),
+                      get_line_range(student, j1, j2), " ".join([t[0] for t in student[j1:j2]])])
+    return {"ratio": matcher.ratio(), "added": added, "removed": removed, "hunks": hunks}
+
+
+def diff_files(texts):
+    """Runs diff_texts in a worker process.
+
+    Arguments:
+    texts - A tuple of the contents of the solution and the student file.
+    """
+    return diff_texts(texts[0], texts[1])
+
+
+def read_text(path):
+    """Returns the content of a text file or None if it can't be read or
+    looks binary.
+    """
+    try:
+        with open(path, "rb") as file:
+            content = file.read()
+    except (IOError, OSError):
+        return None
+    if b"\0" in content:
+        return None
+    return content.decode("utf-8", "replace")
+
+
+def get_diff_key(solution_text, student_text):
+    sha = hashlib.sha1()
+    sha.update(solution_text.encode("utf-8") + b"\0")
+    sha.update(student_text.encode("utf-8"))
+    return sha.hexdigest()
+
+
+class SolutionDiffs:
+    """Diffs of the files of the students against the files with the same
+    name in the solution. The diffs are computed in a pool of worker
+    processes, since difflib is pure Python, and cached by the hash of both
+    files, so unchanged submissions are never compared again.
+    The pool is started right away, so create the object before starting
+    any threads: forking a process with running threads isn't safe.
+
+    Arguments:
+    solution_path - A string. Path to the blatt-xx directory of the solution.
+    jobs - An integer. Number of worker processes, None for one per cpu and
+           0 to compare the files in this process without a pool.
+    cache_path - A string. Path to the json file of the cache.
+    """
+
+    def __init__(self, solution_path, jobs=None, cache_path=CACHE_PATH):
+        self.solution_path = solution_path
+        self.cache_path = cache_path
+        self.pool = multiprocessing.Pool(jobs) if jobs != 0 else None
+        self.cache = self.load_cache()
+        # Whether diffs computed without the pool still have to be saved
+        self.unsaved = False
+        # Path of the blatt-xx directory -> list of (name, key, async result or None)
+        self.pending = {}
+        self.lock = threading.Lock()
+
+
+    def load_cache(self):
+        if os.path.exists(self.cache_path):
+            with open(self.cache_path) as file:
+                try:
+                    return json.load(file)
+                except ValueError:
+                    pass
+        return {}
+
+
+    def save_cache(self):
+        if len(self.cache) > CACHE_MAX_ENTRIES:
+            for key in sorted(self.cache, key=lambda k: self.cache[k]["used"])[:len(self.cache) - CACHE_MAX_ENTRIES]:
+                del self.cache[key]
+        try:
+            with open(self.cache_path, "w") as file:
+                json.dump(self.cache, file)
+        except IOError:
+            pass
+
+
+    def get_file_names(self, path):
+        """Returns the sorted names of the files of the solution that the
+        student submitted too.
+
+        Arguments:
+        path - A string. Path to the blatt-xx directory of the student.
+        """
+        if not os.path.isdir(self.solution_path) or not os.path.isdir(path):
+            return []
+        return sorted([name for name in os.listdir(self.solution_path)
+                       if os.path.isfile(self.solution_path + name) and os.path.isfile(path + name)])
+
+
+    def precompute(self, paths):
+        """Starts comparing the files of all given sheets that weren't
+        compared yet.
+
+        Arguments:
+        paths - A list of strings. Paths to blatt-xx directories in the order
+                in which they are needed.
+        """
+        with self.lock:
+            for path in paths:
+                if path in self.pending:
+                    continue
+                files = []
+                for name in self.get_file_names(path):
+                    solution_text = read_text(self.solution_path + name)
+                    student_text = read_text(path + name)
+                    if solution_text is None or student_text is None:
+                        continue
+                    key = get_diff_key(solution_text, student_text)
+                    if key in self.cache:
+                        files.append((name, key, None))
+                    elif self.pool is None:
+                        self.cache[key] = {"diff": diff_texts(solution_text, student_text), "used": time.time()}
+                        self.unsaved = True
+                        files.append((name, key, None))
+                    else:
+                        files.append((name, key, self.pool.apply_async(diff_files, ((solution_text, student_text),))))
+                self.pending[path] = files
+
+
+    def get_diffs(self, path):
+        """Returns the list of (name, diff) of the sheet, see diff_texts.
+        Waits for the diffs if they aren't computed yet.
+
+        Arguments:
+        path - A string. Path to the blatt-xx directory of the student.
+        """
+        self.precompute([path])
+        with self.lock:
+            files = self.pending[path]
+        diffs = []
+        changed = False
+        for name, key, result in files:
+            if result is not None:
+                diff = result.get()
+                with self.lock:
+                    self.cache[key] = {"diff": diff, "used": time.time()}
+                changed = True
+            entry = self.cache.get(key)
+            if entry is None:
+                # Evicted by another sheet in the meantime
+                continue
+            entry["used"] = time.time()
+            diffs.append((name, entry["diff"]))
+        with self.lock:
+            self.pending[path] = [(name, key, None) for name, key, result in files]
+            if changed or self.unsaved:
+                self.save_cache()
+                self.unsaved = False
+        return diffs
+
+
+    def discard(self, path):
+        """Forgets the diffs of <path>, e.g. after the files were changed."""
+        with self.lock:
+            self.pending.pop(path, None)
+
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+
+def format_summary(diffs):
+    """Returns one line per file with the similarity to the solution and the
+    first differences.
+
+    Arguments:
+    diffs - A list of (name, diff) as returned by SolutionDiffs.get_diffs.
+    """
+    lines = []
+    for name, diff in diffs:
+        lines.append("%s: %d%% like the solution, %d tokens added, %d removed in %d places"
+                     % (name, diff["ratio"] * 100, diff["added"], diff["removed"], len(diff["hunks"])))
+        for solution_lines, solution_tokens, student_lines, student_tokens in diff["hunks"][:SUMMARY_HUNKS]:
+            lines.append("    line %d: %s -> %s" % (student_lines[0], shorten(solution_tokens or "(nothing)"),
+                                                     shorten(student_tokens or "(nothing)")))
+    return lines
+
+
+def shorten(text):
+    if len(text) > MAX_HUNK_WIDTH:
+        return text[:MAX_HUNK_WIDTH - 3] + "..."
+    return text
+
+
+def format_diff(name, diff):
+    """Returns the diff of a file as text. Each hunk shows the tokens of the
+    solution (-) and of the student (+) with their lines.
+
+    Arguments:
+    name - A string. Name of the file.
+    diff - A dictionary as returned by diff_texts.
+    """
+    lines = ["=== %s: %d%% like the solution" % (name, diff["ratio"] * 100)]
+    for solution_lines, solution_tokens, student_lines, student_tokens in diff["hunks"]:
+        lines.append("@@ solution %d-%d, student %d-%d @@" % tuple(solution_lines + student_lines))
+        if solution_tokens:
+            lines.append("- " + solution_tokens)
+        if student_tokens:
+            lines.append("+ " + student_tokens)
+    return "\n".join(lines) + "\n"
\ No newline at end of file
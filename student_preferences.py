@@ -0,0 +1,65 @@
+import os
+
+
+# Absolute path to the student preferences
+PREFERENCES_PATH = "/home/natalie/tutorat/student_preferences.txt"
+
+# Parsed preferences files by path with the mtime they were parsed at
+_cache = {}
+
+
+def parse_preferences(lines):
+    """Builds an index of the preferences of all students.
+    The preferences of a student are the lines after the first line that
+    only contains his username, up to the next line starting with "---".
+    Other lines, such as a header, are ignored, and so are students whose
+    block isn't terminated. Since it isn't known which lines are usernames,
+    every line opens a block until the next "---".
+
+    Arguments:
+    lines - An iterable of strings. Lines of student_preferences.txt.
+    """
+    index = {}
+    seen = set()
+    # Username -> preferences of the blocks opened since the last "---"
+    blocks = {}
+    for line in lines:
+        if line[:3] == "---":
+            index.update(blocks)
+            blocks = {}
+            continue
+        name = line.strip()
+        for student, preferences in blocks.items():
+            if name != student:
+                preferences.append(name)
+        if name and name not in seen:
+            seen.add(name)
+            blocks[name] = []
+    return index
+
+
+def load_preferences(path=PREFERENCES_PATH):
+    """Returns the index of all student preferences. The file is only parsed
+    again if it changed since the last call.
+
+    Arguments:
+    path - A string. Path to student_preferences.txt.
+    """
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    if path not in _cache or _cache[path][0] != mtime:
+        with open(path) as file:
+            _cache[path] = (mtime, parse_preferences(file))
+    return _cache[path][1]
+
+
+def get_student_preferences(student, path=PREFERENCES_PATH):
+    """Returns the list of preferences of <student>.
+
+    Arguments:
+    student - username of the student
+    path - A string. Path to student_preferences.txt.
+    """
+    return list(load_preferences(path).get(student, []))
\ No newline at end of file
@@ -1,7 +1,12 @@
-from subprocess import call, Popen, PIPE
+from subprocess import PIPE, STDOUT
+from multiprocessing.pool import ThreadPool
 import os
 import sys
-import re
+import getopt
+from svn_tools import SvnSnapshot, svn_info, MAX_TARGETS
+from tracing import call, Popen
+from clean_check import scan_sheet, check_file, format_problems
+import tracing
 
 
 # Color schemes
@@ -16,6 +21,10 @@ UNDERLINE = '\033[4m'
 
 # Absolute path to the working directory
 PATH = "/home/natalie/tutorat/abgaben/"
+# svn status and svn diff of all students
+svn_snapshot = SvnSnapshot(PATH)
+# Message of all feedback commits
+COMMIT_MESSAGE = "Added feedback"
 
 
 def run_svn_diff(path):
@@ -24,24 +33,42 @@ def run_svn_diff(path):
     Returns a list of lists of the changed files and their changes.
 
     Arguments:
-    path - A string. Path to the blatt-xx directory of the student.
+    path - A string. Path to the directory of the student.
     """
-    p = Popen(["svn", "diff", path], stdin=PIPE, stdout=PIPE, stderr=PIPE)
-    output, err = p.communicate()
-    lines = output.split("\n")
-    changed_files = []
-    for line in lines:
-        changed_file = re.match(r"^\+\+\+\s(.*)\t", line, re.MULTILINE)
-        if changed_file:
-            changed_files.append((changed_file.group(1), []))
-        change = re.match(r"^([\+\-][^\+\-].*)$", line, re.MULTILINE)
-        if change:
-            print(change.group(1))
-            changed_files[-1][1].append(change.group(1))
-    return changed_files
-
-
-def commit_student(student, sheet_num):
+    student = os.path.basename(os.path.normpath(path))
+    return svn_snapshot.get_diff(student)
+
+
+def get_junk(student, sheet_num):
+    """Looks for binaries, core dumps and large files among the files that
+    the commit would add: the whole sheet if it isn't under version control
+    yet, otherwise only feedback-tutor.txt. Also checks their total size
+    against the budget of the sheet.
+    Returns a list of lines describing the problems, empty if there are none.
+
+    Arguments:
+    student - A string. Name of the student directory.
+    sheet_num - A string. Two digit sheet number.
+    """
+    path_to_sheet = PATH + student + "/blatt-" + sheet_num
+    problems = []
+    added_size = 0
+    for path in get_files_to_add(student, sheet_num):
+        if path == path_to_sheet:
+            problems, added_size = scan_sheet(path_to_sheet + "/")
+            continue
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            continue
+        reason = check_file(path, size)
+        if reason:
+            problems.append((os.path.relpath(path, path_to_sheet), size, reason))
+        added_size += size
+    return format_problems(problems, added_size, sheet_num)
+
+
+def commit_student(student, sheet_num, force=False):
     print(HEADER + "\n" + "*"*80 + ENDC)
     print(OKBLUE + BOLD + "Checking student %s" % student + ENDC)
 
@@ -58,6 +85,17 @@ def commit_student(student, sheet_num):
                 print("    %s" % change)
             print("")
 
+    # Don't add binaries and large files without asking
+    junk = [] if force else get_junk(student, sheet_num)
+    if junk:
+        print(FAIL + "Found files that don't belong into svn:" + ENDC)
+        for line in junk:
+            print(FAIL + "    %s" % line + ENDC)
+        with tracing.phase("input"):
+            user_input = raw_input(OKGREEN + "Enter commit to add and commit them anyway, ENTER to skip " + ENDC)
+        if user_input.strip() != "commit":
+            return
+
     # Add files not yet under version control
     # TODO(np76): Will prolly have to change that to add only new files
     call(["svn", "add", path_to_sheet])
@@ -65,10 +103,11 @@ def commit_student(student, sheet_num):
     
     # Show svn status
     print(WARNING + "svn status in directory %s" % path_to_student + ENDC)
-    call(["svn", "stat", path_to_student])
+    svn_snapshot.print_status(student)
 
     # Let the user check everything before commiting changes
-    user_input = raw_input(OKGREEN + "Press ENTER to continue " + ENDC)
+    with tracing.phase("input"):
+        user_input = raw_input(OKGREEN + "Press ENTER to continue " + ENDC)
 
     if user_input == "recheck":
         # Show differences since last update
@@ -80,12 +119,13 @@ def commit_student(student, sheet_num):
     elif user_input == "quit":
         exit()
     else:
-        call(["svn", "commit", path_to_sheet, "-m", "Added feedback"])
+        call(["svn", "commit", path_to_sheet, "-m", COMMIT_MESSAGE])
 
-    user_input = raw_input(OKGREEN + "All good? " + ENDC)
+    with tracing.phase("input"):
+        user_input = raw_input(OKGREEN + "All good? " + ENDC)
 
 
-def commit_all_students(directories, sheet_num):
+def print_intro():
     print(OKBLUE + BOLD + "\n" + "#"*80 + ENDC)
     print(OKBLUE + """What I will do:\n
     - Show svn differences\n
@@ -96,18 +136,247 @@ def commit_all_students(directories, sheet_num):
 
     print(OKBLUE + BOLD + "Path to be commited: %s" % PATH + ENDC)
 
+
+def commit_all_students(directories, sheet_num, force=False):
+    print_intro()
+
     for dirc in directories:
         if "." not in dirc:
-            commit_student(dirc, sheet_num)
+            with tracing.phase("student", dirc):
+                commit_student(dirc, sheet_num, force)
+
+
+def get_files_to_add(student, sheet_num):
+    """Returns the unversioned paths of a student that commit_student would
+    add: the sheet directory itself or his feedback-tutor.txt.
+
+    Arguments:
+    student - A string. Name of the student directory.
+    sheet_num - A string. Two digit sheet number.
+    """
+    path_to_sheet = PATH + student + "/blatt-" + sheet_num
+    unversioned = [path for item, path in svn_snapshot.get_status(student) if item == "unversioned"]
+    if path_to_sheet in unversioned:
+        return [path_to_sheet]
+    if path_to_sheet + "/feedback-tutor.txt" in unversioned:
+        return [path_to_sheet + "/feedback-tutor.txt"]
+    return []
+
+
+def has_changes_to_commit(student, sheet_num):
+    path_to_sheet = PATH + student + "/blatt-" + sheet_num
+    for item, path in svn_snapshot.get_status(student):
+        if item not in ["unversioned", "normal", "ignored", "external"] and \
+                (path == path_to_sheet or path.startswith(path_to_sheet + "/")):
+            return True
+    return False
+
+
+def run_svn_commit(paths):
+    """Commits the given paths with a single svn commit.
+    Returns a tuple of the output and the exit status.
+
+    Arguments:
+    paths - A list of strings. Paths to the blatt-xx directories.
+    """
+    p = Popen(["svn", "commit", "--non-interactive", "-m", COMMIT_MESSAGE] + paths,
+              stdin=PIPE, stdout=PIPE, stderr=STDOUT, universal_newlines=True)
+    output, err = p.communicate()
+    return output, p.returncode
+
+
+def commit_group(students, sheet_num):
+    """Commits the sheets of students that share a repository in one svn
+    commit. If that fails, every student is committed on his own to find out
+    whose commit fails.
+    Returns a dictionary that maps each student to a tuple of the output and
+    the exit status of his commit.
+
+    Arguments:
+    students - A list of strings. Names of the student directories.
+    sheet_num - A string. Two digit sheet number.
+    """
+    paths = [PATH + student + "/blatt-" + sheet_num for student in students]
+    with tracing.phase("commit_group", ",".join(students)):
+        output, returncode = run_svn_commit(paths)
+        if returncode == 0 or len(students) == 1:
+            return dict((student, (output, returncode)) for student in students)
+        results = {}
+        for student, path in zip(students, paths):
+            results[student] = run_svn_commit([path])
+    return results
+
+
+def commit_all_students_batch(directories, sheet_num, jobs, force=False):
+    """Adds the new feedback files of all students with one svn add, shows
+    one combined status and commits all approved students with one svn commit
+    per repository, running up to <jobs> commits in parallel. Students with
+    unversioned binaries or large files are blocked unless <force> is set.
+
+    Arguments:
+    directories - A list of strings. Names of the student directories.
+    sheet_num - A string. Two digit sheet number.
+    jobs - An integer. Number of commits that run at the same time.
+    force - A boolean. Adds and commits junk too if true.
+    """
+    print_intro()
+
+    students = sorted([dirc for dirc in directories if "." not in dirc])
+    with tracing.phase("svn_snapshot"):
+        svn_snapshot.preload(students)
+
+    # Show differences since last update
+    for student in students:
+        changed_files = svn_snapshot.get_diff(student)
+        if changed_files:
+            print(HEADER + "\n" + "*"*80 + ENDC)
+            print(WARNING + "Wait a second! There have been some changes for %s:" % student + ENDC)
+            for changed_file in changed_files:
+                print(BOLD + "    In %s:" % changed_file[0] + ENDC)
+                for change in changed_file[1]:
+                    print("    %s" % change)
+
+    # Block students with junk that isn't under version control yet
+    blocked = []
+    if not force:
+        for student in students:
+            junk = get_junk(student, sheet_num)
+            if junk:
+                if not blocked:
+                    print(HEADER + "\n" + "*"*80 + ENDC)
+                    print(FAIL + "Found files that don't belong into svn, use --force to commit them anyway:" + ENDC)
+                blocked.append(student)
+                print(BOLD + "%s:" % student + ENDC)
+                for line in junk:
+                    print(FAIL + "    %s" % line + ENDC)
+
+    # Add files not yet under version control with a single svn add
+    to_add = []
+    for student in students:
+        if student not in blocked:
+            to_add += get_files_to_add(student, sheet_num)
+    with tracing.phase("add"):
+        for i in range(0, len(to_add), MAX_TARGETS):
+            call(["svn", "add", "-q"] + to_add[i:i + MAX_TARGETS])
+        svn_snapshot.forget(students)
+        svn_snapshot.preload(students)
+
+    # Show one combined svn status
+    print(HEADER + "\n" + "*"*80 + ENDC)
+    print(WARNING + "svn status of all students" + ENDC)
+    for student in students:
+        if svn_snapshot.get_status(student):
+            print(BOLD + "%s:" % student + ENDC)
+            svn_snapshot.print_status(student)
+
+    candidates = [s for s in students if s not in blocked and has_changes_to_commit(s, sheet_num)]
+    if not candidates:
+        print(OKGREEN + "Nothing to commit." + ENDC)
+        return
+    print(OKBLUE + "Students with changes to commit: %s" % " ".join(candidates) + ENDC)
+
+    # Let the user check everything before commiting changes
+    with tracing.phase("input"):
+        user_input = raw_input(OKGREEN + "Press ENTER to commit all, enter the students to skip or quit: " + ENDC)
+    if user_input.strip() == "quit":
+        exit()
+    skipped = user_input.split()
+    for student in skipped:
+        if student not in candidates:
+            print(WARNING + "Unknown student %s" % student + ENDC)
+    approved = [s for s in candidates if s not in skipped]
+
+    # Students in the same repository are committed together
+    info = svn_info([PATH + s + "/" for s in approved])
+    groups = {}
+    for student in approved:
+        root = info.get(PATH + student + "/", {}).get("root") or student
+        groups.setdefault(root, []).append(student)
+
+    pool = ThreadPool(jobs)
+    try:
+        with tracing.phase("commit"):
+            group_results = pool.map(lambda group: commit_group(group, sheet_num), list(groups.values()))
+    finally:
+        pool.close()
+        pool.join()
+    results = {}
+    for group_result in group_results:
+        results.update(group_result)
+
+    # Report the result for each student
+    print(HEADER + "\n" + "*"*80 + ENDC)
+    print(OKBLUE + BOLD + "Summary" + ENDC)
+    failed = 0
+    for student in students:
+        if student in results:
+            output, returncode = results[student]
+            if returncode == 0:
+                print(OKGREEN + "    %-20s committed" % student + ENDC)
+            else:
+                failed += 1
+                print(FAIL + "    %-20s failed" % student + ENDC)
+                for line in output.strip().split("\n"):
+                    print(FAIL + "        %s" % line + ENDC)
+        elif student in skipped:
+            print(WARNING + "    %-20s skipped" % student + ENDC)
+        elif student in blocked:
+            print(FAIL + "    %-20s blocked by junk" % student + ENDC)
+        elif svn_snapshot.get_error(student):
+            print(FAIL + "    %-20s svn failed: %s" % (student, svn_snapshot.get_error(student)) + ENDC)
+        else:
+            print(OKBLUE + "    %-20s nothing to commit" % student + ENDC)
+    if failed:
+        print(FAIL + "%d commits failed." % failed + ENDC)
+
+
+def print_usage_and_exit():
+    print(WARNING + "Usage: python ./svn_commit.py <sheet number> [-b] [-j <number of workers>] [-f] [--trace <file>]" + ENDC)
+    sys.exit(2)
+
 
 def main():
+    options = "bj:fh"
+    long_options = ["batch", "jobs=", "force", "trace=", "help"]
+    try:
+        opts, args = getopt.gnu_getopt(sys.argv, options, long_options)
+    except getopt.GetoptError:
+        print("There has been an error while parsing the command line arguments.")
+        print_usage_and_exit()
+
+    batch = False
+    jobs = 4
+    trace_path = None
+    force = False
+    for opt, opt_args in opts:
+        if opt == '-b' or opt == '--batch': batch = True
+        elif opt == '-j' or opt == '--jobs':
+            if not opt_args.isdigit() or int(opt_args) < 1:
+                print_usage_and_exit()
+            jobs = int(opt_args)
+        elif opt == '-f' or opt == '--force': force = True
+        elif opt == '--trace': trace_path = opt_args
+        elif opt == '-h' or opt == '--help':
+            string = ("Usage: python ./svn_commit.py <sheet number> [arguments]\n\n"
+                      "Arguments:\n"
+                      "-b, --batch\t\t" + "Add, review and commit all students at once.\n"
+                      "-j, --jobs <n>\t\t" + "Run up to <n> commits in parallel in batch mode.\n"
+                      "-f, --force\t\t" + "Also add binaries, core dumps and large files.\n"
+                      "--trace <file>\t\t" + "Append the duration of each phase and svn call to <file> (JSONL).\n"
+                      "-h, --help\t\t" + "Show help options.\n")
+            print(BOLD + string + ENDC)
+            sys.exit(2)
+        else:
+            print_usage_and_exit()
+
     # Exit if a wrong number of command line arguments is given
-    arguments = sys.argv
-    if len(arguments) != 2:
-        print(WARNING + "Usage: python ./svn_commit.py <sheet number>" + ENDC)
-        exit()
+    if len(args) != 2:
+        print_usage_and_exit()
+
+    if trace_path:
+        tracing.enable(trace_path, "svn_commit")
 
-    sheet_num = arguments[1].zfill(2)
+    sheet_num = args[1].zfill(2)
     directories = os.listdir(PATH)
     directories.sort()
 
@@ -116,7 +385,10 @@ def main():
         print(WARNING + "Strange number of directories. Please check:" + ENDC)
         print(directories)
 
-    commit_all_students(directories, sheet_num)
+    if batch:
+        commit_all_students_batch(directories, sheet_num, jobs, force)
+    else:
+        commit_all_students(directories, sheet_num, force)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,389 @@
+from subprocess import PIPE
+import os
+import re
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+from tracing import Popen
+
+
+# Color schemes
+FAIL = '\033[91m'
+ENDC = '\033[0m'
+
+# Maximum number of targets passed to a single svn call
+MAX_TARGETS = 100
+
+# First column of svn status for each item of svn status --xml
+STATUS_CODES = {"added": "A", "conflicted": "C", "deleted": "D", "external": "X",
+                "ignored": "I", "incomplete": "!", "missing": "!", "modified": "M",
+                "normal": " ", "obstructed": "~", "replaced": "R", "unversioned": "?"}
+
+# Maximum number of changed lines kept per file of svn diff
+MAX_CHANGES = 200
+
+FILE_PATTERN = re.compile(r"^\+\+\+\s(.*)\t")
+CHANGE_PATTERN = re.compile(r"^[\+\-][^\+\-]")
+
+
+def svn_info(targets, revision=None):
+    """Runs svn info --xml on all targets using as few svn calls as possible.
+    Returns a dictionary that maps each target to a dictionary with the keys
+    "url", "root", "revision", "last_changed" and "depth" (working copies
+    only). Targets that svn could not query are missing in the dictionary.
+
+    Arguments:
+    targets - A list of strings. Working copy paths or repository URLs.
+    revision - A string. Revision to query, e.g. "HEAD". Uses the working copy
+               revision if None.
+    """
+    info = {}
+    for i in range(0, len(targets), MAX_TARGETS):
+        chunk = targets[i:i + MAX_TARGETS]
+        command = ["svn", "info", "--xml", "--non-interactive"]
+        if revision:
+            command += ["-r", revision]
+        p = Popen(command + chunk, stdin=PIPE, stdout=PIPE, stderr=PIPE,
+                  universal_newlines=True)
+        output, err = p.communicate()
+        if "<info" not in output:
+            continue
+        try:
+            root = ET.fromstring(output)
+        except ET.ParseError:
+            continue
+
+        # svn normalizes trailing slashes and reports the basename as path for
+        # URLs, so match the entries against both path and url
+        by_name = {}
+        for entry in root.findall("entry"):
+            commit = entry.find("commit")
+            values = {"url": entry.findtext("url"),
+                      "root": entry.findtext("repository/root"),
+                      "revision": int(entry.get("revision", -1)),
+                      "last_changed": int(commit.get("revision", -1)) if commit is not None else -1,
+                      "depth": entry.findtext("wc-info/depth")}
+            by_name[entry.get("path")] = values
+            by_name[values["url"]] = values
+        for target in chunk:
+            if target.rstrip("/") in by_name:
+                info[target] = by_name[target.rstrip("/")]
+    return info
+
+def get_fingerprint(path):
+    """Returns a cheap fingerprint of a working copy that changes whenever a
+    file in it is edited, added or removed or svn touches its metadata.
+
+    Arguments:
+    path - A string. Path to the working copy.
+    """
+    latest = 0
+    count = 0
+    for root, dirs, files in os.walk(path):
+        if ".svn" in dirs:
+            dirs.remove(".svn")
+        for name in dirs + files:
+            try:
+                latest = max(latest, os.lstat(os.path.join(root, name)).st_mtime)
+            except OSError:
+                pass
+            count += 1
+    wc_db = os.path.join(path, ".svn", "wc.db")
+    wc_db_mtime = os.path.getmtime(wc_db) if os.path.exists(wc_db) else 0
+    return (latest, count, wc_db_mtime)
+
+
+def parse_svn_diff(lines, max_changes=MAX_CHANGES):
+    """Parses svn diff output line by line.
+    Yields a tuple of each changed file and its changes as soon as the diff of
+    the file is complete. At most <max_changes> changes are kept per file.
+
+    Arguments:
+    lines - An iterable of strings. Lines of svn diff output.
+    max_changes - An integer. Maximum number of changes kept per file.
+    """
+    changed_file = None
+    skipped = 0
+    for line in lines:
+        # Only lines starting with + or - can be headers or changes
+        if not line or line[0] not in "+-":
+            continue
+        line = line.rstrip("\n")
+        file_match = FILE_PATTERN.match(line)
+        if file_match:
+            if changed_file:
+                yield finish_changed_file(changed_file, skipped)
+            changed_file = (file_match.group(1), [])
+            skipped = 0
+        elif changed_file and CHANGE_PATTERN.match(line):
+            if len(changed_file[1]) < max_changes:
+                changed_file[1].append(line)
+            else:
+                skipped += 1
+    if changed_file:
+        yield finish_changed_file(changed_file, skipped)
+
+
+def finish_changed_file(changed_file, skipped):
+    if skipped:
+        changed_file[1].append("[... %d more changes]" % skipped)
+    return changed_file
+
+
+def iter_svn_diff(targets, errors=None):
+    """Runs svn diff on the targets and parses its output while it is being
+    read from the pipe.
+    Yields a tuple of each changed file and its changes.
+
+    Arguments:
+    targets - A list of strings. Working copy paths.
+    errors - A list or None. The error message is appended to it if svn
+             fails after all output was read.
+    """
+    # stderr goes to a file since a pipe that isn't read while parsing could
+    # fill up and block svn
+    stderr = tempfile.TemporaryFile()
+    p = Popen(["svn", "diff"] + targets, stdin=PIPE, stdout=PIPE, stderr=stderr,
+              universal_newlines=True)
+    try:
+        for changed_file in parse_svn_diff(iter(p.stdout.readline, "")):
+            yield changed_file
+        p.wait()
+        if p.returncode != 0 and errors is not None:
+            stderr.seek(0)
+            errors.append(stderr.read().decode("utf-8", "replace").strip()
+                          or "svn diff exited with status %d" % p.returncode)
+    finally:
+        p.stdout.close()
+        if p.poll() is None:
+            p.kill()
+        p.wait()
+        stderr.close()
+
+
+def has_changes(path):
+    """Checks whether anything in <path> was changed since the last update.
+    Stops svn status as soon as the first modified file is found.
+
+    Arguments:
+    path - A string. Working copy path.
+    """
+    devnull = open(os.devnull, "w")
+    p = Popen(["svn", "status", "-q", path], stdin=PIPE, stdout=PIPE, stderr=devnull,
+              universal_newlines=True)
+    changed = False
+    try:
+        for line in iter(p.stdout.readline, ""):
+            # Text status in the first, property status in the second column
+            if line[0] in "ACDMR!~" or line[1:2] in ["C", "M"]:
+                changed = True
+                break
+    finally:
+        p.stdout.close()
+        if p.poll() is None:
+            p.kill()
+        p.wait()
+        devnull.close()
+    return changed
+
+
+class SvnSnapshot:
+    """Runs svn status and svn diff once over all student working copies in
+    <path> and splits the result by student. The result of a student is
+    recomputed when the fingerprint of his working copy changes.
+    The svn calls and fingerprints run without holding the lock, so threads
+    only wait for each other while the results are read or stored.
+    If svn fails for a student, his result is empty, the error is kept and
+    no fingerprint is stored, so the next query asks svn again.
+    """
+
+    def __init__(self, path):
+        # Absolute path to the directory containing the student working copies
+        self.path = path
+        self.status = {}
+        self.diffs = {}
+        self.fingerprints = {}
+        # Error of svn for each student whose last refresh failed
+        self.errors = {}
+        self.lock = threading.Lock()
+        # Makes sure only one thread loads all students at once
+        self.load_lock = threading.Lock()
+
+
+    def get_students(self):
+        return sorted([d for d in os.listdir(self.path) if "." not in d])
+
+
+    def refresh(self, students):
+        """Runs one svn status and one svn diff for the given students.
+
+        Arguments:
+        students - A list of strings. Names of the student directories.
+        """
+        fingerprints = dict((student, get_fingerprint(self.path + student)) for student in students)
+        status = dict((student, []) for student in students)
+        diffs = dict((student, []) for student in students)
+        errors = {}
+
+        for i in range(0, len(students), MAX_TARGETS):
+            self.run_status(students[i:i + MAX_TARGETS], status, errors)
+
+        # Only students with local modifications need an svn diff
+        modified = [s for s in students if s not in errors and
+                    [e for e in status[s] if e[0] not in ["unversioned", "external", "ignored"]]]
+        for i in range(0, len(modified), MAX_TARGETS):
+            self.run_diff(modified[i:i + MAX_TARGETS], diffs, errors)
+
+        with self.lock:
+            self.status.update(status)
+            self.diffs.update(diffs)
+            for student in students:
+                if student in errors:
+                    self.errors[student] = errors[student]
+                    self.fingerprints.pop(student, None)
+                else:
+                    self.errors.pop(student, None)
+                    self.fingerprints[student] = fingerprints[student]
+        for student in sorted(errors):
+            print(FAIL + "svn failed for %s: %s" % (student, errors[student]) + ENDC)
+
+
+    def run_status(self, students, status, errors):
+        """Runs svn status for the given students and adds the entries to
+        <status>. If svn fails, every student is queried on his own, so that
+        a broken working copy only affects its own result.
+
+        Arguments:
+        students - A list of strings. Names of the student directories.
+        status - A dictionary. Maps each student to his list of entries.
+        errors - A dictionary. The error of svn is stored for each student
+                 that failed.
+        """
+        p = Popen(["svn", "status", "--xml"] + [self.path + s for s in students], stdin=PIPE,
+                  stdout=PIPE, stderr=PIPE, universal_newlines=True)
+        output, err = p.communicate()
+        root = None
+        if p.returncode == 0:
+            try:
+                root = ET.fromstring(output)
+            except ET.ParseError:
+                pass
+        if root is None:
+            if len(students) > 1:
+                for student in students:
+                    self.run_status([student], status, errors)
+            else:
+                errors[students[0]] = err.strip() or "svn status exited with status %d" % p.returncode
+            return
+        for target in root.findall("target"):
+            student = self.get_student(target.get("path"))
+            for entry in target.findall("entry"):
+                item = entry.find("wc-status").get("item")
+                status[student].append((item, entry.get("path")))
+
+
+    def run_diff(self, students, diffs, errors):
+        """Runs svn diff for the given students and stores the changed files
+        in <diffs>. Like run_status, it falls back to one call per student if
+        svn fails.
+        """
+        svn_errors = []
+        found = dict((student, []) for student in students)
+        for changed_file in iter_svn_diff([self.path + s for s in students], svn_errors):
+            found[self.get_student(changed_file[0])].append(changed_file)
+        if svn_errors and len(students) > 1:
+            for student in students:
+                self.run_diff([student], diffs, errors)
+            return
+        if svn_errors:
+            errors[students[0]] = svn_errors[0]
+        diffs.update(found)
+
+
+    def get_student(self, path):
+        return os.path.relpath(path, self.path).split(os.sep)[0]
+
+
+    def preload(self, students):
+        """Loads all given students that weren't loaded yet with one svn call.
+
+        Arguments:
+        students - A list of strings. Names of the student directories.
+        """
+        with self.load_lock:
+            with self.lock:
+                students = [s for s in students if s not in self.fingerprints]
+            if students:
+                self.refresh(students)
+
+
+    def forget(self, students):
+        """Forgets the results of the given students, e.g. after svn add, so
+        that the next preload or query loads them again.
+
+        Arguments:
+        students - A list of strings. Names of the student directories.
+        """
+        with self.lock:
+            for student in students:
+                self.fingerprints.pop(student, None)
+
+
+    def update(self, student):
+        """Makes sure the result for <student> is up to date. The first query
+        loads all students at once.
+
+        Arguments:
+        student - A string. Name of the student directory.
+        """
+        with self.lock:
+            fingerprint = self.fingerprints.get(student)
+        if fingerprint is None:
+            students = self.get_students()
+            if student not in students:
+                students.append(student)
+            self.preload(students)
+        elif fingerprint != get_fingerprint(self.path + student):
+            self.refresh([student])
+
+
+    def get_error(self, student):
+        """Returns the error of svn if the last query for <student> failed,
+        None otherwise.
+        """
+        with self.lock:
+            return self.errors.get(student)
+
+
+    def get_diff(self, student):
+        """Returns a list of tuples of the changed files and their changes.
+
+        Arguments:
+        student - A string. Name of the student directory.
+        """
+        self.update(student)
+        with self.lock:
+            return self.diffs[student]
+
+
+    def get_status(self, student):
+        """Returns a list of tuples of the svn status item and the path of
+        each entry of svn status.
+
+        Arguments:
+        student - A string. Name of the student directory.
+        """
+        self.update(student)
+        with self.lock:
+            return self.status[student]
+
+
+
+    def print_status(self, student):
+        """Prints the svn status of <student> like svn stat does.
+
+        Arguments:
+        student - A string. Name of the student directory.
+        """
+        for item, path in self.get_status(student):
+            print("%s       %s" % (STATUS_CODES.get(item, "?"), path))
\ No newline at end of file
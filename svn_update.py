@@ -1,6 +1,14 @@
-from subprocess import call
+from subprocess import PIPE, STDOUT
+from multiprocessing.pool import ThreadPool
 import sys
 import os
+import re
+import time
+import getopt
+import json
+from svn_tools import svn_info
+from tracing import call, Popen
+import tracing
 
 
 # Color schemes
@@ -15,9 +23,11 @@ UNDERLINE = '\033[4m'
 
 # Absolute path to the working directory
 PATH = "/home/natalie/tutorat/abgaben/"
+# Last remote revision seen for each student repository
+STATE_PATH = "/home/natalie/tutorat/svn_update_state.json"
 
 
-def update_all_students(directories):
+def print_intro():
     print(OKBLUE + BOLD + "\n" + "#"*80 + ENDC)
     print(OKBLUE + BOLD + "#"*80 + ENDC)
     print(OKBLUE + "What I will do:\n- Update all student repositories" + ENDC)
@@ -26,22 +36,321 @@ def update_all_students(directories):
 
     print(OKBLUE + BOLD + "Path to be updated: %s" % PATH + ENDC)
 
-    for dirc in directories:
-        if "." not in dirc:
-            print(HEADER + "\n" + "*"*80 + ENDC)
-            print(OKBLUE + BOLD + "Updating student %s" % dirc + ENDC)
-            path_to_student = PATH + dirc + "/"
-            call(["svn", "update", path_to_student])
+
+def get_update_commands(student, sheet_num=None, depth=None, interactive=False):
+    """Returns the list of svn commands needed to update a student.
+    Without a sheet number the whole repository is updated. With a sheet
+    number the working copy is made sparse: only the files at the top level
+    and the blatt-<sheet_num> directory are fetched.
+
+    Arguments:
+    student - A string. Name of the student directory.
+    sheet_num - A string. Two digit sheet number or None.
+    depth - A string. Current depth of the student working copy or None.
+    interactive - A boolean. Lets svn ask for credentials if true. Only
+                  svn calls attached to the terminal may do that.
+    """
+    path_to_student = PATH + student + "/"
+    update = ["svn", "update"] if interactive else ["svn", "update", "--non-interactive"]
+    if not sheet_num:
+        return [update + [path_to_student]]
+
+    commands = []
+    if depth in [None, "infinity"]:
+        # Turn a full working copy into a sparse one. This removes the old
+        # sheets from disk, they stay in the repository.
+        commands.append(update + ["--set-depth", "files", path_to_student])
+    else:
+        commands.append(update + ["--depth", "files", path_to_student])
+    commands.append(update + ["--parents", "--set-depth", "infinity", path_to_student + "blatt-" + sheet_num])
+    return commands
+
+
+def get_depths(students):
+    """Returns a dictionary that maps each student to the depth of its working
+    copy using a single batched svn info.
+
+    Arguments:
+    students - A list of strings. Names of the student directories.
+    """
+    info = svn_info([PATH + s + "/" for s in students])
+    depths = {}
+    for student in students:
+        if PATH + student + "/" in info:
+            depths[student] = info[PATH + student + "/"]["depth"]
+    return depths
+
+
+def update_all_students(directories, sheet_num=None):
+    print_intro()
+
+    students = [dirc for dirc in directories if "." not in dirc]
+    with tracing.phase("depths"):
+        depths = get_depths(students) if sheet_num else {}
+    for dirc in students:
+        print(HEADER + "\n" + "*"*80 + ENDC)
+        print(OKBLUE + BOLD + "Updating student %s" % dirc + ENDC)
+        with tracing.phase("update", dirc):
+            for command in get_update_commands(dirc, sheet_num, depths.get(dirc), interactive=True):
+                call(command)
 
     print(OKGREEN + "Updated all students." + ENDC)
 
 
+def get_update_status(output, returncode):
+    """Classifies the output of an svn update.
+    Returns one of "failed", "conflicted", "updated" or "unchanged".
+
+    Arguments:
+    output - A string. Combined stdout and stderr of svn update.
+    returncode - An integer. Exit status of svn update.
+    """
+    if returncode != 0:
+        return "failed"
+    for line in output.split("\n"):
+        # Text, property and tree conflicts are marked with a C in one of
+        # the first four columns
+        if re.match(r"^[ UGE]{0,3}C\s", line):
+            return "conflicted"
+    for line in output.split("\n"):
+        if re.match(r"^[ADUGER ]{1,4}\s+\S", line) or line.startswith("Updated to revision"):
+            return "updated"
+    return "unchanged"
+
+
+def update_student(student, sheet_num=None, depth=None):
+    """Runs svn update for a single student and captures the result.
+    Returns a dictionary with the output, exit status, wall time and update
+    status of the student repository.
+
+    Arguments:
+    student - A string. Name of the student directory.
+    sheet_num - A string. Only update blatt-<sheet_num> if given.
+    depth - A string. Current depth of the student working copy or None.
+    """
+    start = time.time()
+    output = ""
+    returncode = 0
+    with tracing.phase("update", student):
+        for command in get_update_commands(student, sheet_num, depth):
+            p = Popen(command, stdin=PIPE, stdout=PIPE, stderr=STDOUT, universal_newlines=True)
+            out, err = p.communicate()
+            output += out
+            returncode = returncode or p.returncode
+    duration = time.time() - start
+    return {"student": student,
+            "output": output,
+            "returncode": returncode,
+            "duration": duration,
+            "status": get_update_status(output, returncode)}
+
+
+def print_update_summary(results, wall_time):
+    status_colors = {"updated": OKGREEN, "unchanged": OKBLUE,
+                     "conflicted": WARNING, "failed": FAIL}
+    print(HEADER + "\n" + "*"*80 + ENDC)
+    print(OKBLUE + BOLD + "Summary" + ENDC)
+    print(BOLD + "    %-20s %-12s %8s" % ("Student", "Status", "Time") + ENDC)
+    for result in results:
+        color = status_colors[result["status"]]
+        print(color + "    %-20s %-12s %7.2fs" % (result["student"], result["status"],
+                                                  result["duration"]) + ENDC)
+    for status in ["updated", "unchanged", "conflicted", "failed"]:
+        count = len([r for r in results if r["status"] == status])
+        print(status_colors[status] + "    %d %s" % (count, status) + ENDC)
+    print(OKBLUE + "    Total wall time: %.2fs" % wall_time + ENDC)
+
+
+def run_updates(students, jobs, sheet_num=None):
+    """Runs svn update for the given students using a pool of <jobs> workers.
+    Returns the list of results in the order of <students> and the total wall
+    time.
+
+    Arguments:
+    students - A list of strings. Names of the student directories.
+    jobs - An integer. Number of concurrent svn update processes.
+    sheet_num - A string. Only update blatt-<sheet_num> if given.
+    """
+    start = time.time()
+    with tracing.phase("depths"):
+        depths = get_depths(students) if sheet_num else {}
+    pool = ThreadPool(jobs)
+    try:
+        results = pool.map(lambda s: update_student(s, sheet_num, depths.get(s)), students)
+    finally:
+        pool.close()
+        pool.join()
+    return results, time.time() - start
+
+
+def print_update_results(results, wall_time):
+    for result in results:
+        print(HEADER + "\n" + "*"*80 + ENDC)
+        print(OKBLUE + BOLD + "Updating student %s" % result["student"] + ENDC)
+        color = FAIL if result["status"] == "failed" else ENDC
+        print(color + result["output"].rstrip("\n") + ENDC)
+
+    print_update_summary(results, wall_time)
+
+    if all(r["status"] in ["updated", "unchanged"] for r in results):
+        print(OKGREEN + "Updated all students." + ENDC)
+    else:
+        print(WARNING + "Not all students were updated cleanly." + ENDC)
+
+
+def update_all_students_concurrently(directories, jobs, sheet_num=None):
+    """Runs svn update for all students using a pool of <jobs> workers.
+    The output of each repository is printed in sorted order once all updates
+    are done, followed by a summary table.
+
+    Arguments:
+    directories - A list of strings. Names of the student directories.
+    jobs - An integer. Number of concurrent svn update processes.
+    sheet_num - A string. Only update blatt-<sheet_num> if given.
+    """
+    print_intro()
+    print(OKBLUE + BOLD + "Running %d updates in parallel" % jobs + ENDC)
+
+    students = sorted([dirc for dirc in directories if "." not in dirc])
+    results, wall_time = run_updates(students, jobs, sheet_num)
+    print_update_results(results, wall_time)
+
+
+def load_state():
+    if os.path.exists(STATE_PATH):
+        with open(STATE_PATH) as file:
+            try:
+                return json.load(file)
+            except ValueError:
+                print(WARNING + "Ignoring corrupt state file %s" % STATE_PATH + ENDC)
+    return {}
+
+
+def save_state(state):
+    with open(STATE_PATH, "w") as file:
+        json.dump(state, file, indent=1, sort_keys=True)
+
+
+def get_changed_students(students, state, sheet_num=None):
+    """Compares the last changed revision of each student repository on the
+    server with the last revision seen for this student. A repository that
+    was last updated for another sheet counts as changed too, since the
+    working copy doesn't contain the new sheet yet.
+    Returns the list of students that need an update and a dictionary that
+    maps each student to its repository url and remote revision.
+
+    Arguments:
+    students - A list of strings. Names of the student directories.
+    state - A dictionary. Maps students to their url, last seen revision and
+            the sheet and depth of the last update.
+    sheet_num - A string. Sheet that is updated or None for all sheets.
+    """
+    # Students that have never been seen are looked up in their working copy
+    known = {}
+    unknown = [s for s in students if s not in state]
+    local_info = svn_info([PATH + s + "/" for s in unknown])
+    for student in students:
+        if student in state:
+            known[student] = state[student]
+        elif PATH + student + "/" in local_info:
+            info = local_info[PATH + student + "/"]
+            known[student] = {"url": info["url"], "revision": info["last_changed"]}
+
+    # One batched query for the HEAD revision of all repositories
+    urls = [known[s]["url"] for s in students if s in known]
+    remote_info = svn_info(urls, revision="HEAD")
+
+    changed = []
+    remote = {}
+    for student in students:
+        if student not in known or known[student]["url"] not in remote_info:
+            # Let svn update decide if the repository can't be queried
+            changed.append(student)
+            continue
+        revision = remote_info[known[student]["url"]]["last_changed"]
+        remote[student] = {"url": known[student]["url"], "revision": revision}
+        if revision != known[student]["revision"] or state.get(student, {}).get("sheet") != sheet_num:
+            changed.append(student)
+    return changed, remote
+
+
+def update_changed_students(directories, jobs, sheet_num=None):
+    """Updates only the student repositories that have changed on the server
+    since the last run and remembers the new revisions in STATE_PATH.
+
+    Arguments:
+    directories - A list of strings. Names of the student directories.
+    jobs - An integer. Number of concurrent svn update processes.
+    sheet_num - A string. Only update blatt-<sheet_num> if given.
+    """
+    print_intro()
+
+    students = sorted([dirc for dirc in directories if "." not in dirc])
+    state = load_state()
+    with tracing.phase("remote_status"):
+        changed, remote = get_changed_students(students, state, sheet_num)
+    print(OKBLUE + BOLD + "%d of %d repositories have changed" % (len(changed), len(students)) + ENDC)
+
+    results, wall_time = run_updates(changed, jobs, sheet_num)
+    # Remember what the working copy contains now
+    fetched = {"sheet": sheet_num, "depth": "files" if sheet_num else "infinity"}
+    for result in results:
+        if result["status"] != "failed" and result["student"] in remote:
+            state[result["student"]] = dict(remote[result["student"]], **fetched)
+    for student in students:
+        if student not in changed and student in remote:
+            state[student] = dict(remote[student], **fetched)
+    save_state(state)
+
+    print_update_results(results, wall_time)
+    print(OKBLUE + "    Skipped %d unchanged repositories." % (len(students) - len(changed)) + ENDC)
+
+
+def print_usage_and_exit():
+    print(WARNING + "Usage: python ./svn_update.py [-j <number of workers>] [-c] [-s <sheet number>] [--trace <file>]" + ENDC)
+    sys.exit(2)
+
+
 def main():
+    options = "j:cs:h"
+    long_options = ["jobs=", "changed_only", "sheet=", "trace=", "help"]
+    try:
+        opts, args = getopt.gnu_getopt(sys.argv, options, long_options)
+    except getopt.GetoptError:
+        print("There has been an error while parsing the command line arguments.")
+        print_usage_and_exit()
+
+    jobs = 1
+    changed_only = False
+    sheet_num = None
+    trace_path = None
+    for opt, opt_args in opts:
+        if opt == '-j' or opt == '--jobs':
+            if not opt_args.isdigit() or int(opt_args) < 1:
+                print_usage_and_exit()
+            jobs = int(opt_args)
+        elif opt == '-c' or opt == '--changed_only': changed_only = True
+        elif opt == '-s' or opt == '--sheet': sheet_num = opt_args.zfill(2)
+        elif opt == '--trace': trace_path = opt_args
+        elif opt == '-h' or opt == '--help':
+            string = ("Usage: python ./svn_update.py [arguments]\n\n"
+                      "Arguments:\n"
+                      "-j, --jobs <n>\t\t" + "Run <n> svn updates in parallel and print a summary.\n"
+                      "-c, --changed_only\t" + "Only update repositories that changed on the server.\n"
+                      "-s, --sheet <n>\t\t" + "Only fetch blatt-<n> and top level files (sparse working copy).\n"
+                      "--trace <file>\t\t" + "Append the duration of each phase and svn call to <file> (JSONL).\n"
+                      "-h, --help\t\t" + "Show help options.\n")
+            print(BOLD + string + ENDC)
+            sys.exit(2)
+        else:
+            print_usage_and_exit()
+
     # Exit if a wrong number of command line arguments is given
-    arguments = sys.argv
-    if len(arguments) != 1:
-        print(WARNING + "Usage: python ./svn_update.py" + ENDC)
-        exit()
+    if len(args) != 1:
+        print_usage_and_exit()
+
+    if trace_path:
+        tracing.enable(trace_path, "svn_update")
 
     directories = os.listdir(PATH)
     directories.sort()
@@ -51,7 +360,12 @@ def main():
         print(WARNING + "Strange number of directories. Please check:" + ENDC)
         print(directories)
 
-    update_all_students(directories)
+    if changed_only:
+        update_changed_students(directories, jobs, sheet_num)
+    elif jobs > 1:
+        update_all_students_concurrently(directories, jobs, sheet_num)
+    else:
+        update_all_students(directories, sheet_num)
 
 
 if __name__ == "__main__":
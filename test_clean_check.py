@@ -0,0 +1,74 @@
+import os
+import shutil
+import tempfile
+import unittest
+from clean_check import get_file_type, scan_sheet
+
+
+ELF_HEADER = b"\x7fELF\x02\x01\x01" + b"\0" * 9
+
+
+class GetFileTypeTest(unittest.TestCase):
+
+    # Name, content, expected type
+    CASES = [("main.c", b"int main() { return 0; }\n", None),
+             ("empty", b"", None),
+             ("prog", ELF_HEADER + b"\x02\x00", "ELF executable"),
+             ("main.o", ELF_HEADER + b"\x01\x00", "ELF object file"),
+             ("libx.so", ELF_HEADER + b"\x03\x00", "ELF executable or shared library"),
+             ("dump", ELF_HEADER + b"\x04\x00", "ELF core dump"),
+             ("short", b"\x7fELF\x02", "ELF binary"),
+             ("libx.a", b"!<arch>\nfoo", "static library"),
+             ("Main.class", b"\xca\xfe\xba\xbe\x00\x00", "Java class file"),
+             ("a.exe", b"MZ\x90\x00", "Windows executable"),
+             ("abgabe.zip", b"PK\x03\x04rest", "zip archive"),
+             ("abgabe.tar.gz", b"\x1f\x8b\x08\x00", "gzip archive"),
+             ("core", b"anything", "core dump"),
+             ("core.1234", b"anything", "core dump"),
+             ("core.c", b"int core;\n", None),
+             ("MZ.txt", b"Mzungu\n", None)]
+
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + "/"
+
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+
+    def test_cases(self):
+        for name, content, expected in self.CASES:
+            with open(self.path + name, "wb") as file:
+                file.write(content)
+            self.assertEqual(get_file_type(self.path + name), expected, name)
+
+
+    def test_missing_file(self):
+        self.assertEqual(get_file_type(self.path + "missing"), None)
+
+
+class ScanSheetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + "/"
+        os.makedirs(self.path + "src")
+        with open(self.path + "src/a.c", "w") as file:
+            file.write("ab\n")
+
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+
+    def test_symlinks_are_reported_not_followed(self):
+        os.symlink(".", self.path + "self")
+        os.symlink("..", self.path + "src/up")
+        problems, total_size = scan_sheet(self.path)
+        self.assertEqual([(name, reason) for name, size, reason in problems],
+                         [("self", "symbolic link to ."), ("src/up", "symbolic link to ..")])
+        self.assertEqual(total_size, 3 + len(".") + len(".."))
+
+
+if __name__ == "__main__":
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,34 @@
+import unittest
+from feedback import parse_feedback_lines
+
+
+class ParseFeedbackLinesTest(unittest.TestCase):
+
+    # Lines, points of the exercises, computed total, declared total, errors
+    CASES = [([], [], 0.0, None, []),
+             (["Aufgabe 1\n", "4/5\n", "Aufgabe 2\n", "5.5/10\n", "9.5/20\n"],
+              [4.0, 5.5], 9.5, 9.5, []),
+             (["Aufgabe 1\n", "/5\n", "/20\n"], [], 0.0, None, ["/5", "/20"]),
+             (["3/5\n", "4/5\n", "8/20\n"], [3.0, 4.0], 7.0, 8.0, ["Expected: 7.0, Actual: 8"]),
+             (["3/5\n", "3/20\n", "2/5\n", "5/20\n"], [3.0, 2.0], 5.0, 3.0, []),
+             (["../5\n"], [], 0.0, None, ["Invalid points: ../5"]),
+             (["Gut: 5/5\n", "  4/5\n", "4/5 Punkte\n"], [4.0], 4.0, None, []),
+             (["4/5"], [4.0], 4.0, None, [])]
+
+
+    def test_cases(self):
+        for lines, points, computed_total, declared_total, errors in self.CASES:
+            feedback = parse_feedback_lines(lines)
+            self.assertEqual([exercise[0] for exercise in feedback.exercises], points, lines)
+            self.assertEqual(feedback.computed_total, computed_total, lines)
+            self.assertEqual(feedback.declared_total, declared_total, lines)
+            self.assertEqual(feedback.errors, errors, lines)
+
+
+    def test_exercises_keep_maximum_and_line(self):
+        feedback = parse_feedback_lines(["2.5/10 siehe unten\n"])
+        self.assertEqual(feedback.exercises, [(2.5, 10, "2.5/10 siehe unten")])
+
+
+if __name__ == "__main__":
+    unittest.main()
\ No newline at end of file
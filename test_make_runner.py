@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+import unittest
+from make_runner import get_source_hash, get_kill_reason, DEFAULT_LIMITS
+
+
+class GetSourceHashTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + "/"
+        self.write("main.c", "int main() { return 0; }\n")
+        self.write("Makefile", "test:\n")
+        self.write("feedback-tutor.txt", "Aufgabe 1\n/5\n")
+
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+
+    def write(self, name, content):
+        if not os.path.isdir(os.path.dirname(self.path + name)):
+            os.makedirs(os.path.dirname(self.path + name))
+        with open(self.path + name, "w") as file:
+            file.write(content)
+
+
+    def test_feedback_is_ignored(self):
+        before = get_source_hash(self.path)
+        self.write("feedback-tutor.txt", "Aufgabe 1\n5/5\nGut gemacht.\n")
+        self.assertEqual(get_source_hash(self.path), before)
+
+
+    def test_missing_feedback_is_ignored(self):
+        before = get_source_hash(self.path)
+        os.remove(self.path + "feedback-tutor.txt")
+        self.assertEqual(get_source_hash(self.path), before)
+
+
+    def test_nested_feedback_is_hashed(self):
+        before = get_source_hash(self.path)
+        self.write("src/feedback-tutor.txt", "x\n")
+        self.assertNotEqual(get_source_hash(self.path), before)
+
+
+    def test_changes_to_sources(self):
+        changes = [("main.c", "int main() { return 1; }\n"),
+                   ("src/util.c", "int f;\n"),
+                   ("Makefile", "test:\n\techo\n")]
+        for name, content in changes:
+            before = get_source_hash(self.path)
+            self.write(name, content)
+            self.assertNotEqual(get_source_hash(self.path), before, name)
+
+
+    def test_path_without_trailing_slash(self):
+        before = get_source_hash(self.path.rstrip("/"))
+        self.write("feedback-tutor.txt", "changed\n")
+        self.assertEqual(get_source_hash(self.path.rstrip("/")), before)
+
+
+    def test_limits_are_hashed(self):
+        limits = dict(DEFAULT_LIMITS)
+        unlimited = get_source_hash(self.path)
+        limited = get_source_hash(self.path, limits)
+        self.assertNotEqual(limited, unlimited)
+        limits["timeout"] += 1
+        self.assertEqual(get_source_hash(self.path, limits), limited)
+        limits["cpu"] += 1
+        self.assertNotEqual(get_source_hash(self.path, limits), limited)
+
+
+class GetKillReasonTest(unittest.TestCase):
+
+    # Output, exit status, timed out, expected reason
+    CASES = [("", 0, False, None),
+             ("", 124, True, "wall clock timeout of 120s exceeded, killed all processes"),
+             ("", -9, False, "make was killed by signal 9"),
+             ("make: *** [Makefile:2: test] Error 152\n", 2, False, "cpu time limit exceeded"),
+             ("make: *** [Makefile:2: test] Error 137\n", 2, False, "killed"),
+             ("make[1]: *** [Makefile:5: run] Killed\n", 2, False, "killed"),
+             ("make: *** [test] CPU time limit exceeded (core dumped)\n", 2, False, "cpu time limit exceeded"),
+             ("make: *** [Makefile:2: test] Error 139\n", 2, False, "killed by signal 11"),
+             ("make: *** [Makefile:2: test] Error 1\n", 2, False, None),
+             ("Killed 3 of 4 mutants\nmake: *** [Makefile:2: test] Error 1\n", 2, False, None),
+             ("Exception in thread \"main\" java.lang.OutOfMemoryError\n", 2, False, "memory limit exceeded"),
+             ("Killed\n", 0, False, None)]
+
+
+    def test_cases(self):
+        for output, returncode, timed_out, expected in self.CASES:
+            self.assertEqual(get_kill_reason(output, returncode, timed_out, DEFAULT_LIMITS), expected, output)
+
+
+if __name__ == "__main__":
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+from student_preferences import get_student_preferences
+
+
+def get_student_preferences_old(student, path):
+    # The original implementation that scanned the file for every student
+    preferences = []
+    if os.path.exists(path):
+        with open(path) as file:
+            lines = file.readlines()
+            found_student = False
+            for i, line in enumerate(lines):
+                if line[:3] == "---" and found_student:
+                    return preferences
+                elif line.strip() == student:
+                    found_student = True
+                elif found_student:
+                    preferences.append(line.strip())
+    return []
+
+
+class GetStudentPreferencesTest(unittest.TestCase):
+
+    STUDENTS = ["alice", "bob", "carol", "dave"]
+
+    # Description, content of student_preferences.txt
+    CASES = [("empty", ""),
+             ("one block", "alice\ngerman\nno tabs\n---\n"),
+             ("two blocks", "alice\ngerman\n---\nbob\nenglish\n---\n"),
+             ("header", "Preferences\n\nalice\ngerman\n---\n"),
+             ("header and separator", "Preferences\n---\nalice\ngerman\n---\n"),
+             ("blank lines", "alice\n\ngerman\n\n---\n\nbob\nenglish\n---\n"),
+             ("indented name", "  alice  \ngerman\n---\n"),
+             ("no preferences", "alice\n---\nbob\nenglish\n---\n"),
+             ("unterminated", "alice\ngerman\n---\nbob\nenglish\n"),
+             ("twice", "alice\ngerman\n---\nalice\nenglish\n---\n"),
+             ("name repeated", "alice\nalice\ngerman\n---\n"),
+             ("name as preference", "bob\nlike alice\nalice\n---\nalice\ngerman\n---\n"),
+             ("text between blocks", "alice\ngerman\n---\nsee below\nbob\nenglish\n---\n"),
+             ("long separator", "alice\ngerman\n-----------\nbob\n---x\n"),
+             ("indented separator", "alice\ngerman\n  ---\nmore\n---\n"),
+             ("no newline at end", "alice\ngerman\n---")]
+
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + "/student_preferences.txt"
+
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.path))
+
+
+    def test_cases(self):
+        for i, (description, content) in enumerate(self.CASES):
+            with open(self.path, "w") as file:
+                file.write(content)
+            # Make sure that the cache doesn't hide the new content
+            os.utime(self.path, (0, i + 1))
+            for student in self.STUDENTS:
+                self.assertEqual(get_student_preferences(student, self.path),
+                                 get_student_preferences_old(student, self.path),
+                                 "%s: %s" % (description, student))
+
+
+    def test_missing(self):
+        self.assertEqual(get_student_preferences("alice", self.path), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
\ No newline at end of file
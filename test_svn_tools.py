@@ -0,0 +1,113 @@
+import unittest
+import svn_tools
+from svn_tools import parse_svn_diff, has_changes
+
+
+class FakeSvn:
+    """Stands in for svn status -q and remembers how many lines were read
+    and whether svn was killed.
+    """
+
+    instances = []
+
+    def __init__(self, lines):
+        self.lines = list(lines)
+        self.read = 0
+        self.killed = False
+        self.returncode = None
+        self.stdout = self
+
+    def __call__(self, command, **kwargs):
+        FakeSvn.instances.append(self)
+        return self
+
+    def readline(self):
+        if self.read == len(self.lines):
+            self.returncode = 0
+            return ""
+        self.read += 1
+        return self.lines[self.read - 1]
+
+    def close(self):
+        pass
+
+    def poll(self):
+        return self.returncode
+
+    def kill(self):
+        self.killed = True
+        self.returncode = -9
+
+    def wait(self):
+        return self.returncode
+
+
+DIFF_A = ["Index: a.c\n",
+          "===================================================================\n",
+          "--- a.c\t(revision 3)\n",
+          "+++ a.c\t(working copy)\n",
+          "@@ -1,2 +1,2 @@\n",
+          "-int x;\n",
+          "+long x;\n",
+          " int y;\n"]
+DIFF_B = ["Index: dir/b.txt\n",
+          "--- dir/b.txt\t(nonexistent)\n",
+          "+++ dir/b.txt\t(working copy)\n",
+          "@@ -0,0 +1 @@\n",
+          "+neu\n"]
+
+
+class ParseSvnDiffTest(unittest.TestCase):
+
+    # Lines, maximum number of changes, expected changed files
+    CASES = [([], 200, []),
+             (["Index: a.c\n", "=====\n"], 200, []),
+             (DIFF_A, 200, [("a.c", ["-int x;", "+long x;"])]),
+             (DIFF_A + DIFF_B, 200, [("a.c", ["-int x;", "+long x;"]), ("dir/b.txt", ["+neu"])]),
+             (DIFF_A, 1, [("a.c", ["-int x;", "[... 1 more changes]"])]),
+             (["-x\n", "+y\n"] + DIFF_B, 200, [("dir/b.txt", ["+neu"])]),
+             (["+++ c.c\t(working copy)\n", "+\n", "++i;\n", "--i;\n", "+ok"], 200, [("c.c", ["+ok"])])]
+
+
+    def test_cases(self):
+        for lines, max_changes, expected in self.CASES:
+            self.assertEqual(list(parse_svn_diff(lines, max_changes)), expected, lines)
+
+
+    def test_yields_each_file_when_it_is_complete(self):
+        changed_files = parse_svn_diff(iter(DIFF_A + DIFF_B))
+        self.assertEqual(next(changed_files)[0], "a.c")
+        self.assertEqual(next(changed_files)[0], "dir/b.txt")
+
+
+class HasChangesTest(unittest.TestCase):
+
+    # Lines of svn status -q, expected result, lines read
+    CASES = [([], False, 0),
+             (["M       a.c\n", "M       b.c\n", "A       c.c\n"], True, 1),
+             ([" M      blatt-01\n", "M       a.c\n"], True, 1),
+             (["X       external\n", "        > moved from x\n", "D       old.c\n", "M       a.c\n"], True, 3),
+             (["!       missing.c\n"], True, 1),
+             (["X       external\n", "Performing status on external item at 'ext':\n"], False, 2)]
+
+
+    def setUp(self):
+        self.popen = svn_tools.Popen
+
+
+    def tearDown(self):
+        svn_tools.Popen = self.popen
+
+
+    def test_cases(self):
+        for lines, expected, read in self.CASES:
+            svn = FakeSvn(lines)
+            svn_tools.Popen = svn
+            self.assertEqual(has_changes("/tmp/wc"), expected, lines)
+            self.assertEqual(svn.read, read, lines)
+            # svn is stopped at the first change instead of running to the end
+            self.assertEqual(svn.killed, expected, lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
\ No newline at end of file
@@ -0,0 +1,28 @@
+import unittest
+from svn_update import get_update_status
+
+
+class GetUpdateStatusTest(unittest.TestCase):
+
+    # Output of svn update, exit status, expected status
+    CASES = [("Updating '.':\nAt revision 5.\n", 0, "unchanged"),
+             ("", 0, "unchanged"),
+             ("Updating '.':\nA    blatt-02\nA    blatt-02/main.c\nUpdated to revision 6.\n", 0, "updated"),
+             ("Updating '.':\nU    blatt-01/main.c\nUpdated to revision 7.\n", 0, "updated"),
+             ("Updating '.':\n U   blatt-01\nUpdated to revision 7.\n", 0, "updated"),
+             ("Updating '.':\nD    blatt-01/old.c\nG    blatt-01/main.c\nUpdated to revision 8.\n", 0, "updated"),
+             ("Updating '.':\nC    blatt-01/main.c\nUpdated to revision 9.\n"
+              "Summary of conflicts:\n  Text conflicts: 1\n", 0, "conflicted"),
+             ("Updating '.':\n C   blatt-01\nUpdated to revision 9.\n", 0, "conflicted"),
+             ("Updating '.':\n   C blatt-01/dir\nUpdated to revision 9.\n", 0, "conflicted"),
+             ("svn: E170013: Unable to connect to a repository\n", 1, "failed"),
+             ("Updating '.':\nU    blatt-01/main.c\n", 1, "failed")]
+
+
+    def test_cases(self):
+        for output, returncode, expected in self.CASES:
+            self.assertEqual(get_update_status(output, returncode), expected, output)
+
+
+if __name__ == "__main__":
+    unittest.main()
\ No newline at end of file
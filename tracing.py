@@ -0,0 +1,225 @@
+# Timing instrumentation for the scripts. Once a script calls enable, every
+# phase and every subprocess started through tracing.Popen or tracing.call
+# appends a line of JSON to the trace file:
+#   {"kind": "phase", "phase": "student/make", "student": "...", "start": ..., "duration": ...}
+#   {"kind": "command", "program": "svn", "command": "svn diff", "phase": ..., ...}
+# disable (called at exit) prints a summary of where the wall time went.
+# Without enable, phase and Popen only cost a function call.
+
+import os
+import json
+import time
+import atexit
+import contextlib
+import threading
+import subprocess
+
+
+# Color schemes
+HEADER = '\033[95m'
+OKBLUE = '\033[94m'
+OKGREEN = '\033[92m'
+WARNING = '\033[93m'
+FAIL = '\033[91m'
+ENDC = '\033[0m'
+BOLD = '\033[1m'
+UNDERLINE = '\033[4m'
+
+# The tracer of the running script or None if tracing is disabled
+tracer = None
+
+
+class Tracer:
+    """Writes the trace records of one run and sums up the durations per
+    phase and per program for the summary.
+    """
+
+    def __init__(self, path, script):
+        self.path = path
+        self.script = script
+        self.file = open(path, "a")
+        self.lock = threading.Lock()
+        # Stack of (phase, student) of each thread
+        self.local = threading.local()
+        self.start = time.time()
+        # Name -> [count, total duration]
+        self.phases = {}
+        self.programs = {}
+
+
+    def get_stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+
+    def get_context(self):
+        """Returns the name of the current phase and student of this thread."""
+        stack = self.get_stack()
+        if not stack:
+            return None, None
+        return stack[-1]
+
+
+    def push(self, name, student=None):
+        parent, parent_student = self.get_context()
+        if parent:
+            name = parent + "/" + name
+        self.get_stack().append((name, student or parent_student))
+        return name
+
+
+    def pop(self):
+        self.get_stack().pop()
+
+
+    def write(self, record, totals, key):
+        record["script"] = self.script
+        with self.lock:
+            # Phases that outlive a disabled tracer aren't recorded
+            if self.file.closed:
+                return
+            self.file.write(json.dumps(record, sort_keys=True) + "\n")
+            entry = totals.setdefault(key, [0, 0.0])
+            entry[0] += 1
+            entry[1] += record["duration"]
+
+
+    def record_phase(self, name, student, start, duration):
+        record = {"kind": "phase", "phase": name, "student": student,
+                  "start": round(start, 6), "duration": round(duration, 6)}
+        self.write(record, self.phases, name)
+
+
+    def record_command(self, args, context, start, duration, returncode):
+        if isinstance(args, str):
+            args = args.split()
+        program = os.path.basename(args[0]) if args else "?"
+        # Subcommand and first argument are enough to tell the calls apart
+        command = " ".join(args[:2]) if program in ("svn", "git") else program
+        record = {"kind": "command", "program": program, "command": command,
+                  "phase": context[0], "student": context[1], "start": round(start, 6),
+                  "duration": round(duration, 6), "returncode": returncode}
+        self.write(record, self.programs, command)
+
+
+    def print_summary(self):
+        """Prints the time spent in each phase and program compared to the
+        wall time of the run. Nested phases are part of their parent phase.
+        """
+        wall_time = max(time.time() - self.start, 1e-9)
+        # Phases and commands of parallel workers overlap, so their sum may
+        # exceed the wall time
+        print(HEADER + "\n" + "*"*80 + ENDC)
+        print(OKBLUE + BOLD + "Trace summary of %s: %.2fs wall time, trace in %s"
+              % (self.script, wall_time, self.path) + ENDC)
+        print(BOLD + "    %-40s %6s %10s %7s" % ("Phase", "Count", "Total", "Wall") + ENDC)
+        traced = 0.0
+        for name in sorted(self.phases):
+            count, total = self.phases[name]
+            depth = name.count("/")
+            if depth == 0:
+                traced += total
+            label = "  "*depth + name.split("/")[-1]
+            print("    %-40s %6d %9.2fs %6.1f%%" % (label, count, total, 100*total/wall_time))
+        print("    %-40s %6s %9.2fs %6.1f%%" % ("(outside of phases)", "", max(wall_time - traced, 0),
+                                               100*max(wall_time - traced, 0)/wall_time))
+        if self.programs:
+            print(BOLD + "    %-40s %6s %10s %7s" % ("Command", "Count", "Total", "Wall") + ENDC)
+            for command in sorted(self.programs, key=lambda c: -self.programs[c][1]):
+                count, total = self.programs[command]
+                print("    %-40s %6d %9.2fs %6.1f%%" % (command, count, total, 100*total/wall_time))
+
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+@contextlib.contextmanager
+def phase(name, student=None):
+    """Traces the duration of the enclosed block. Phases nest, the student is
+    inherited from the enclosing phase if not given.
+
+    Arguments:
+    name - A string. Name of the phase.
+    student - A string. Name of the student the phase belongs to.
+    """
+    current = tracer
+    if not current:
+        yield
+        return
+    full_name = current.push(name, student)
+    student = current.get_context()[1]
+    start = time.time()
+    try:
+        yield
+    finally:
+        current.pop()
+        current.record_phase(full_name, student, start, time.time() - start)
+
+
+class Popen(subprocess.Popen):
+    """subprocess.Popen that traces the time until the process is reaped."""
+
+    def __init__(self, args, *popenargs, **kwargs):
+        self.trace_args = args
+        self.tracer = tracer
+        if self.tracer:
+            self.trace_context = self.tracer.get_context()
+            self.trace_start = time.time()
+        subprocess.Popen.__init__(self, args, *popenargs, **kwargs)
+
+
+    def finish_trace(self):
+        if self.tracer and self.returncode is not None:
+            tracer_of_process = self.tracer
+            self.tracer = None
+            tracer_of_process.record_command(self.trace_args, self.trace_context, self.trace_start,
+                                             time.time() - self.trace_start, self.returncode)
+
+
+    def wait(self, *args, **kwargs):
+        returncode = subprocess.Popen.wait(self, *args, **kwargs)
+        self.finish_trace()
+        return returncode
+
+
+    def poll(self, *args, **kwargs):
+        returncode = subprocess.Popen.poll(self, *args, **kwargs)
+        self.finish_trace()
+        return returncode
+
+
+def call(*popenargs, **kwargs):
+    """Like subprocess.call, but traced."""
+    return Popen(*popenargs, **kwargs).wait()
+
+
+def enable(path, script):
+    """Starts tracing to the JSONL file <path>. The summary is printed when
+    disable is called or the script exits.
+
+    Arguments:
+    path - A string. Path to the trace file, records are appended.
+    script - A string. Name of the script written to each record.
+    """
+    global tracer
+    disable()
+    try:
+        tracer = Tracer(path, script)
+    except IOError as e:
+        print(WARNING + "Could not open the trace file %s: %s" % (path, e) + ENDC)
+
+
+def disable():
+    """Stops tracing and prints the summary."""
+    global tracer
+    if tracer:
+        current = tracer
+        tracer = None
+        current.close()
+        current.print_summary()
+
+
+atexit.register(disable)
\ No newline at end of file
@@ -0,0 +1,215 @@
+# One entry point for all scripts:
+# - update: svn_update.py
+# - correct: correction_script.py
+# - check: final_check.py
+# - commit: svn_commit.py
+# - gradebook: gradebook.py
+# - similarity: similarity.py
+# - daemon: keeps the state of the non-interactive commands in memory
+#
+# The scripts are only imported when their command is run. With --daemon
+# the non-interactive commands are sent to a running daemon, which keeps
+# the directory snapshots, svn snapshots, parsed feedback and make results of
+# previous runs in memory.
+
+import os
+import sys
+import json
+import socket
+import tracing
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+# Color schemes
+HEADER = '\033[95m'
+OKBLUE = '\033[94m'
+OKGREEN = '\033[92m'
+WARNING = '\033[93m'
+FAIL = '\033[91m'
+ENDC = '\033[0m'
+BOLD = '\033[1m'
+UNDERLINE = '\033[4m'
+
+# Socket of the daemon
+SOCKET_PATH = "/tmp/tutorage-%d.sock" % os.getuid()
+
+# Module of each command and whether it can run in the daemon. Interactive
+# commands always run in the calling process. So does update: svn writes
+# straight to the terminal and may ask for credentials, and the daemon only
+# captures the output of Python.
+COMMANDS = {"update": ("svn_update", False),
+            "correct": ("correction_script", False),
+            "check": ("final_check", True),
+            "commit": ("svn_commit", False),
+            "gradebook": ("gradebook", True),
+            "similarity": ("similarity", True)}
+
+
+def run_command(command, args):
+    """Imports the module of <command> and runs its main function with <args>
+    as command line arguments.
+    Returns the exit status.
+
+    Arguments:
+    command - A string. One of COMMANDS.
+    args - A list of strings. Command line arguments of the script.
+    """
+    module_name = COMMANDS[command][0]
+    module = __import__(module_name)
+    sys.argv = [module_name + ".py"] + args
+    try:
+        if command == "correct":
+            module.Correction().main()
+        else:
+            module.main()
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else 0
+    finally:
+        # A trace ends with its command, also in the daemon
+        tracing.disable()
+    return 0
+
+
+def handle_request(request):
+    """Runs a command in the daemon and captures its output. The command runs
+    in the working directory of the client, so relative paths in its
+    arguments mean the same as without the daemon.
+    Returns a dictionary with the output and the exit status.
+
+    Arguments:
+    request - A dictionary with the command, its arguments and the working
+              directory of the client.
+    """
+    old_stdout = sys.stdout
+    old_cwd = os.getcwd()
+    sys.stdout = StringIO()
+    try:
+        os.chdir(request.get("cwd", old_cwd))
+        status = run_command(request["command"], request["args"])
+    except Exception as e:
+        print(FAIL + "The daemon failed to run %s: %s" % (request["command"], e) + ENDC)
+        status = 1
+    finally:
+        os.chdir(old_cwd)
+        output = sys.stdout.getvalue()
+        sys.stdout = old_stdout
+    return {"output": output, "status": status}
+
+
+def receive_all(connection):
+    chunks = []
+    while True:
+        chunk = connection.recv(65536)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    return b"".join(chunks).decode("utf-8")
+
+
+def run_daemon():
+    """Serves requests on SOCKET_PATH one after another until it receives a
+    stop request. The imported scripts and their caches stay in memory.
+    """
+    if os.path.exists(SOCKET_PATH):
+        # Only remove the socket of a daemon that isn't running anymore
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            client.connect(SOCKET_PATH)
+            print(FAIL + "A daemon is already listening on %s." % SOCKET_PATH + ENDC)
+            sys.exit(1)
+        except socket.error:
+            os.remove(SOCKET_PATH)
+        finally:
+            client.close()
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(SOCKET_PATH)
+    os.chmod(SOCKET_PATH, 0o600)
+    server.listen(5)
+    print(OKBLUE + BOLD + "Daemon listening on %s" % SOCKET_PATH + ENDC)
+    try:
+        while True:
+            connection = server.accept()[0]
+            try:
+                data = receive_all(connection)
+                if not data:
+                    # Another daemon checking whether this one is running
+                    continue
+                request = json.loads(data)
+                if request["command"] == "stop":
+                    connection.sendall(json.dumps({"output": "Daemon stopped.\n", "status": 0}).encode("utf-8"))
+                    break
+                if request["command"] not in COMMANDS or not COMMANDS[request["command"]][1]:
+                    response = {"output": "Command %s can't run in the daemon.\n" % request["command"],
+                                "status": 2}
+                else:
+                    response = handle_request(request)
+                connection.sendall(json.dumps(response).encode("utf-8"))
+            except (ValueError, KeyError, socket.error) as e:
+                print(WARNING + "Bad request: %s" % e + ENDC)
+            finally:
+                connection.close()
+    finally:
+        server.close()
+        os.remove(SOCKET_PATH)
+
+
+def send_request(command, args):
+    """Sends a command to the daemon.
+    Returns the response of the daemon or None if no daemon is running.
+
+    Arguments:
+    command - A string. One of COMMANDS or "stop".
+    args - A list of strings. Command line arguments of the script.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(SOCKET_PATH)
+    except socket.error:
+        return None
+    try:
+        client.sendall(json.dumps({"command": command, "args": args, "cwd": os.getcwd()}).encode("utf-8"))
+        client.shutdown(socket.SHUT_WR)
+        return json.loads(receive_all(client))
+    finally:
+        client.close()
+
+
+def print_usage_and_exit():
+    print(WARNING + "Usage: python ./tutorage.py [--daemon] <command> [arguments]" + ENDC)
+    print(WARNING + "Commands: %s, daemon, stop" % ", ".join(sorted(COMMANDS)) + ENDC)
+    sys.exit(2)
+
+
+def main():
+    args = sys.argv[1:]
+    use_daemon = False
+    if args and args[0] in ["-d", "--daemon"]:
+        use_daemon = True
+        args = args[1:]
+    if not args or args[0] in ["-h", "--help"]:
+        print_usage_and_exit()
+
+    command, args = args[0], args[1:]
+    if command == "daemon":
+        run_daemon()
+    elif command == "stop":
+        response = send_request("stop", [])
+        print(response["output"].rstrip("\n") if response else WARNING + "No daemon is running." + ENDC)
+    elif command not in COMMANDS:
+        print_usage_and_exit()
+    elif use_daemon and COMMANDS[command][1]:
+        response = send_request(command, args)
+        if response is None:
+            print(WARNING + "No daemon is running, running %s here." % command + ENDC)
+            sys.exit(run_command(command, args))
+        sys.stdout.write(response["output"])
+        sys.exit(response["status"])
+    else:
+        sys.exit(run_command(command, args))
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file